@@ -0,0 +1,263 @@
+"""
+Benchmarks for the hot paths of training, solving, loading and serving.
+
+Results are written as JSON. A run can be compared against a saved one; any
+metric that got worse by more than the threshold is reported, and the exit
+status is 1 so the comparison can gate a change:
+
+    python backend/benchmark.py -o baseline.json
+    python backend/benchmark.py --compare baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+
+from play import GameLearning
+from tictactoe.agent import Learner, PolicyIterationAgent, ValueIterationAgent
+from tictactoe.states import game_states
+
+GROUPS = ('training', 'solve', 'get_action', 'files')
+# Metrics where a larger value is better; every other metric is better smaller
+HIGHER_IS_BETTER = {'episodes_per_sec'}
+# Metrics that describe the run rather than its performance
+NOT_COMPARED = {'episodes', 'repeats', 'calls'}
+SEED = 0
+
+
+def _seed():
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+
+def _game_learning(agent_type, path):
+    args = SimpleNamespace(agent_type=agent_type, path=path, load=False, teacher_episodes=None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return GameLearning(args)
+
+
+def _measure(run, repeats):
+    """
+    Call ``run`` ``repeats`` times and once more under tracemalloc.
+
+    ``run`` returns a dict of metrics for one call, including 'seconds'. The
+    result holds the call with the median time, and 'peak_bytes' from the
+    traced call, which is not timed.
+    """
+    calls = []
+    for _ in range(repeats):
+        _seed()
+        calls.append(run())
+    result = sorted(calls, key=lambda c: c['seconds'])[len(calls) // 2]
+    _seed()
+    tracemalloc.start()
+    try:
+        run()
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    result['repeats'] = repeats
+    return result
+
+
+def bench_training(episodes, repeats, tmp):
+    """Episodes per second of ``beginTeaching`` and ``beginSelfPlay``, saving included."""
+    results = {}
+    for agent_type in ('q', 's'):
+        for method in ('teaching', 'self_play'):
+            def run():
+                gl = _game_learning(agent_type, os.path.join(tmp, f'train_{agent_type}.pkl'))
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if method == 'teaching':
+                        gl.beginTeaching(episodes)
+                    else:
+                        gl.beginSelfPlay(episodes)
+                seconds = time.perf_counter() - start
+                return {'seconds': seconds, 'episodes': episodes,
+                        'episodes_per_sec': episodes / seconds}
+            results[f'training.{agent_type}.{method}'] = _measure(run, repeats)
+    return results
+
+
+def bench_solve(repeats):
+    """Solve time and sweep count of every Value and Policy Iteration method."""
+    results = {}
+    solvers = [('value_iteration', m, ValueIterationAgent, 'compute_value_iteration')
+               for m in ('sweep', 'vectorized', 'retrograde')]
+    solvers += [('policy_iteration', m, PolicyIterationAgent, 'compute_policy_iteration')
+                for m in ('sweep', 'exact', 'vectorized', 'retrograde')]
+    for name, method, cls, solve in solvers:
+        def run():
+            agent = cls(gamma=0.9)
+            start = time.perf_counter()
+            sweeps = getattr(agent, solve)(method=method)
+            return {'seconds': time.perf_counter() - start, 'sweeps': sweeps}
+        results[f'solve.{name}.{method}'] = _measure(run, repeats)
+    return results
+
+
+def _agents(episodes, tmp):
+    # One trained or solved agent per type, as the web app serves them
+    agents = {}
+    for agent_type in ('q', 's', 'v', 'p', 'n'):
+        _seed()
+        gl = _game_learning(agent_type, os.path.join(tmp, f'{agent_type}.pkl'))
+        if agent_type in ('q', 's'):
+            with contextlib.redirect_stdout(io.StringIO()):
+                gl.beginTeaching(episodes)
+        agents[agent_type] = gl.agent
+    return agents
+
+
+def bench_get_action(agents, repeats):
+    """p50/p99 ``get_action`` latency over every non-terminal game state."""
+    space = game_states()
+    keys = [space.keys[sid] for sid in space.nonterminal()]
+    results = {}
+    for agent_type, agent in agents.items():
+        _seed()
+        latencies = []
+        get_action = agent.get_action
+        for _ in range(repeats):
+            for key in keys:
+                start = time.perf_counter()
+                get_action(key)
+                latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies)
+        results[f'get_action.{agent_type}'] = {
+            'p50_seconds': float(np.percentile(latencies, 50)),
+            'p99_seconds': float(np.percentile(latencies, 99)),
+            'calls': len(latencies),
+        }
+    return results
+
+
+def bench_files(agents, repeats, tmp):
+    """Save and load time of each agent, and load time of the bundled legacy pickles."""
+    results = {}
+    for agent_type, agent in agents.items():
+        path = os.path.join(tmp, f'files_{agent_type}.pkl')
+
+        def save():
+            start = time.perf_counter()
+            agent.save(path)
+            return {'seconds': time.perf_counter() - start}
+
+        def load():
+            start = time.perf_counter()
+            Learner.load(path)
+            return {'seconds': time.perf_counter() - start}
+
+        results[f'files.{agent_type}.save'] = _measure(save, repeats)
+        results[f'files.{agent_type}.load'] = _measure(load, repeats)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in ('v_agent.pkl', 'p_agent.pkl'):
+        path = os.path.join(here, name)
+        with open(path, 'rb') as f:
+            legacy = f.read(1) == b'\x80'
+        if legacy:
+            def load_legacy():
+                start = time.perf_counter()
+                Learner.load(path)
+                return {'seconds': time.perf_counter() - start}
+            results[f'files.{name[0]}.load_legacy'] = _measure(load_legacy, repeats)
+    return results
+
+
+def run_benchmarks(groups, episodes, repeats):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if 'training' in groups:
+            results.update(bench_training(episodes, repeats, tmp))
+        if 'solve' in groups:
+            results.update(bench_solve(repeats))
+        if 'get_action' in groups or 'files' in groups:
+            agents = _agents(episodes, tmp)
+            if 'get_action' in groups:
+                results.update(bench_get_action(agents, repeats))
+            if 'files' in groups:
+                results.update(bench_files(agents, repeats, tmp))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'episodes': episodes,
+            'repeats': repeats,
+            'seed': SEED,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Changes of every metric present in both runs.
+
+    Returns
+    -------
+    list
+        (benchmark, metric, baseline value, current value, relative change,
+        regressed) tuples; the change is positive when the metric got better
+    """
+    rows = []
+    for name, metrics in current['results'].items():
+        before = baseline['results'].get(name, {})
+        for metric, value in metrics.items():
+            if metric in NOT_COMPARED or metric not in before or not before[metric]:
+                continue
+            change = (value - before[metric]) / before[metric]
+            if metric not in HIGHER_IS_BETTER:
+                change = -change
+            rows.append((name, metric, before[metric], value, change, change < -threshold))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark training, solving, loading and serving.")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="write the results as JSON to this file")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change counted as a regression (default: 0.1)")
+    parser.add_argument("--only", nargs='+', choices=GROUPS, default=list(GROUPS),
+                        help="benchmark groups to run (default: all)")
+    parser.add_argument("--episodes", type=int, default=2000,
+                        help="training episodes per run (default: 2000)")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="timed runs per benchmark; the median is kept (default: 3)")
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.only, args.episodes, args.repeats)
+    for name, metrics in current['results'].items():
+        print(name, ' '.join(f'{metric}={value:.6g}' for metric, value in metrics.items()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(current, baseline, args.threshold)
+        print(f"\nCompared with {args.compare}:")
+        for name, metric, before, value, change, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{name} {metric}: {before:.6g} -> {value:.6g} ({change:+.1%}){flag}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
@@ -1,50 +1,124 @@
 import argparse
 import os
-import pickle
 import sys
+import time
 
-from tictactoe.agent import Qlearner, SARSAlearner, ValueIterationAgent, PolicyIterationAgent
+from tictactoe import metrics
+from tictactoe.agent import (ApproxQlearner, Learner, NegamaxAgent, QLambdaLearner, Qlearner,
+                             SARSALambdaLearner, SARSAlearner, ValueIterationAgent,
+                             PolicyIterationAgent)
+from tictactoe.boards import BOARD_CONFIGS, board_config
 from tictactoe.teacher import Teacher
 from tictactoe.game import Game
+from tictactoe.parallel import train_parallel
+from tictactoe.vecenv import BatchedGames
 
 
 class GameLearning(object):
-    def __init__(self, args, alpha=0.5, gamma=0.9, epsilon=0.1):
+    def __init__(self, args, alpha=None, gamma=None, epsilon=None):
+        # Board geometry, and the defaults tuned for it (see boards.py)
+        self.shape, config = board_config(getattr(args, 'board', None) or '3x3-k3')
+        if args.agent_type not in config['agents']:
+            raise ValueError(f"Agent type {args.agent_type} is not available on the {self.shape.name} board")
+        alpha = config['alpha'] if alpha is None else alpha
+        gamma = config['gamma'] if gamma is None else gamma
+        epsilon = config['epsilon'] if epsilon is None else epsilon
         self.agent_type = args.agent_type
         self.path = args.path
         self.load = args.load
         self.teacher_episodes = args.teacher_episodes
+        self.q_store = getattr(args, 'q_store', None)
+        self.batch_size = getattr(args, 'batch_size', None)
+        self.workers = getattr(args, 'workers', None)
+        self.symmetry = getattr(args, 'symmetry', False)
+        self.sync_every = getattr(args, 'sync_every', None) or 5000
+        self.max_nodes = getattr(args, 'max_nodes', None) or config['max_nodes']
+        self.time_limit = getattr(args, 'time_limit', None) or config['time_limit']
+        self.model = getattr(args, 'model', None) or 'linear'
+        self.hidden = getattr(args, 'hidden', None) or 64
+        # Eligibility traces for new q/s agents: Q(lambda) and SARSA(lambda)
+        self.trace_lambda = getattr(args, 'trace_lambda', None)
+        self.trace = getattr(args, 'trace', None) or 'replacing'
         self.agent = self.load_or_create_agent(alpha, gamma, epsilon)
+        # Experience replay for q/s agents (see replay.py)
+        self.replay = getattr(args, 'replay', None)
+        if self.replay:
+            if self.agent_type not in ('q', 's'):
+                raise ValueError("Replay is only available for Q-learning and SARSA agents")
+            if self.batch_size or self.workers:
+                raise ValueError("Replay cannot be combined with batched or parallel training")
+            if isinstance(self.agent, (QLambdaLearner, SARSALambdaLearner)):
+                raise ValueError("Replay cannot be combined with eligibility traces")
+            self.agent.use_replay(self.replay, every=getattr(args, 'replay_every', None) or 32,
+                                  batch_size=getattr(args, 'replay_batch', None) or 256,
+                                  prioritized=getattr(args, 'prioritized', False))
         self.games_played = 0
+        # Seconds between the metric summaries printed while training
+        self.summary_interval = getattr(args, 'metrics_interval', None) or 10.
+        self.summary_time = time.monotonic()
+        self.summary_snapshot = metrics.snapshot()
 
     def load_or_create_agent(self, alpha, gamma, epsilon):
         if self.load:
             if not os.path.isfile(self.path):
                 raise ValueError("Cannot load agent: file does not exist.")
-            with open(self.path, 'rb') as f:
-                return pickle.load(f)
+            agent = Learner.load(self.path, mmap_mode='c')
+            if agent.shape != self.shape:
+                raise ValueError(f"Cannot load agent: it plays on the {agent.shape.name} board")
+            if self.q_store is not None and self.agent_type in ('q', 's'):
+                agent.use_q_store(self.q_store)
+            else:
+                agent.resume_training()
+            return agent
         else:
             if os.path.isfile(self.path):
                 print(f'An agent is already saved at {self.path}.')
+            q_store = self.q_store or 'dict'
+            if self.trace_lambda is not None and self.agent_type in ('q', 's'):
+                cls = QLambdaLearner if self.agent_type == 'q' else SARSALambdaLearner
+                return cls(alpha, gamma, epsilon, lam=self.trace_lambda, trace=self.trace,
+                           q_store=q_store, symmetry=self.symmetry, shape=self.shape)
             if self.agent_type == "q":
-                return Qlearner(alpha, gamma, epsilon)
+                return Qlearner(alpha, gamma, epsilon, q_store=q_store, symmetry=self.symmetry,
+                                shape=self.shape)
             elif self.agent_type == "s":
-                return SARSAlearner(alpha, gamma, epsilon)
+                return SARSAlearner(alpha, gamma, epsilon, q_store=q_store, symmetry=self.symmetry,
+                                    shape=self.shape)
+            elif self.agent_type == "f":
+                return ApproxQlearner(gamma=gamma, eps=epsilon, model=self.model, hidden=self.hidden,
+                                      shape=self.shape)
             elif self.agent_type == "v":
-                agent = ValueIterationAgent(gamma=gamma)
+                agent = ValueIterationAgent(gamma=gamma, symmetry=self.symmetry, shape=self.shape)
                 print("Computing optimal policy using Value Iteration...")
                 agent.compute_value_iteration()
                 print("Done!")
                 return agent
             elif self.agent_type == "p":
-                agent = PolicyIterationAgent(gamma=gamma)
+                agent = PolicyIterationAgent(gamma=gamma, symmetry=self.symmetry, shape=self.shape)
                 print("Computing optimal policy using Policy Iteration...")
-                agent.compute_policy_iteration()
+                agent.compute_policy_iteration(method='exact')
+                for i, timing in enumerate(agent.timings, 1):
+                    print(f"Iteration {i}: evaluation {timing['evaluation']*1000:.2f} ms, "
+                          f"improvement {timing['improvement']*1000:.2f} ms")
                 print("Done!")
                 return agent
+            elif self.agent_type == "n":
+                return NegamaxAgent(max_nodes=self.max_nodes, time_limit=self.time_limit,
+                                    shape=self.shape)
             else:
                 raise ValueError("Unknown agent type")
 
+    def printSummary(self):
+        # Rates and mean latencies of the instrumented calls since the last summary
+        now = time.monotonic()
+        if now - self.summary_time < self.summary_interval:
+            return
+        snapshot = metrics.snapshot()
+        summary = metrics.summary(self.summary_snapshot, snapshot, now - self.summary_time)
+        if summary:
+            print(summary)
+        self.summary_time, self.summary_snapshot = now, snapshot
+
     def beginPlaying(self):
         print("Welcome to Tic-Tac-Toe. You are 'X' and the computer is 'O'.")
 
@@ -60,7 +134,7 @@ class GameLearning(object):
                     print("Invalid input. Please choose 'y' or 'n'.")
 
         while True:
-            game = Game(self.agent)
+            game = Game(self.agent, shape=self.shape)
             game.start()
             self.games_played += 1
             self.agent.save(self.path)
@@ -68,45 +142,123 @@ class GameLearning(object):
                 print("OK. Quitting.")
                 break
 
+    def beginBatched(self, episodes, opponent):
+        if self.agent_type not in ('q', 's'):
+            raise ValueError("Batched training is only available for Q-learning and SARSA agents")
+        if isinstance(self.agent, (QLambdaLearner, SARSALambdaLearner)):
+            raise ValueError("Batched training is not available with eligibility traces")
+        if not self.shape.standard:
+            raise ValueError("Batched training is only available on the 3x3 board")
+        self.agent.use_q_store('array')
+        env = BatchedGames(self.agent, n_boards=self.batch_size, opponent=opponent)
+        chunk = max(1000, 10*self.batch_size)
+        while self.games_played < episodes:
+            self.games_played += env.play(min(chunk, episodes - self.games_played))
+            print(f"Games played: {self.games_played}")
+            self.printSummary()
+
+        self.agent.save(self.path)
+
+    def beginParallel(self, episodes, opponent):
+        if self.agent_type not in ('q', 's'):
+            raise ValueError("Parallel training is only available for Q-learning and SARSA agents")
+        if not self.shape.standard:
+            raise ValueError("Parallel training is only available on the 3x3 board")
+
+        def report(played):
+            print(f"Games played: {self.games_played + played}")
+
+        self.games_played += train_parallel(
+            self.agent, episodes - self.games_played, self.workers, opponent,
+            sync_every=self.sync_every, batch_size=self.batch_size, callback=report)
+        self.agent.save(self.path)
+
     def beginTeaching(self, episodes):
-        teacher = Teacher()
+        if self.workers:
+            return self.beginParallel(episodes, 'teacher')
+        if self.batch_size:
+            return self.beginBatched(episodes, 'teacher')
+        teacher = Teacher(shape=self.shape)
         while self.games_played < episodes:
-            game = Game(self.agent, player=teacher, player_type='teacher')
+            game = Game(self.agent, player=teacher, player_type='teacher', shape=self.shape)
             game.start()
             self.games_played += 1
             if self.games_played % 1000 == 0:
                 print(f"Games played: {self.games_played}")
+                self.printSummary()
         
         self.agent.save(self.path)
 
     def beginSelfPlay(self, episodes):
+        if self.workers:
+            return self.beginParallel(episodes, 'self')
+        if self.batch_size:
+            return self.beginBatched(episodes, 'self')
         while self.games_played < episodes:
-            game = Game(self.agent, self.agent, player_type='agent')
+            game = Game(self.agent, self.agent, player_type='agent', shape=self.shape)
             game.start()
             self.games_played += 1
             if self.games_played % 1000 == 0:
                 print(f"Games played: {self.games_played}")
+                self.printSummary()
         self.agent.save(self.path)
 
 
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Play Tic-Tac-Toe.")
-    parser.add_argument("-a", "--agent", type=str, choices=['q', 's', 'v', 'p'], 
-                        default='q', help="Agent type (q=Q-Learning, s=SARSA, v=Value Iteration, p=Policy Iteration)")
+    parser.add_argument("-a", "--agent", dest="agent_type", type=str, choices=['q', 's', 'f', 'v', 'p', 'n'], 
+                        default='q', help="Agent type (q=Q-Learning, s=SARSA, f=Q-Learning with function "
+                                          "approximation, v=Value Iteration, p=Policy Iteration, "
+                                          "n=Negamax search)")
     parser.add_argument("-p", "--path", type=str, required=False,
-                        help="Specify the path for the agent pickle file.")
+                        help="Specify the path for the agent file.")
     parser.add_argument("-l", "--load", action="store_true",
                         help="whether to load trained agent")
     parser.add_argument("-t", "--teacher_episodes", default=None, type=int,
                         help="employ teacher agent who knows the optimal strategy")
     parser.add_argument("--self-play", default=None, type=int,
                         help="number of episodes for self-play training")
+    parser.add_argument("--q-store", choices=['dict', 'array'], default=None,
+                        help="Q-value storage for q/s agents; a loaded agent is migrated")
+    parser.add_argument("--batch-size", default=None, type=int,
+                        help="train q/s agents headless on this many boards in lockstep "
+                             "(uses the array Q store)")
+    parser.add_argument("--symmetry", action="store_true",
+                        help="treat rotated and mirrored boards as one state (new agents only)")
+    parser.add_argument("--workers", default=None, type=int,
+                        help="train q/s agents in this many processes, merging their Q-tables")
+    parser.add_argument("--sync-every", default=None, type=int,
+                        help="games each worker plays between Q-table merges (default: 5000)")
+    parser.add_argument("--lambda", dest="trace_lambda", default=None, type=float,
+                        help="create q/s agents as Q(lambda)/SARSA(lambda) with this trace decay")
+    parser.add_argument("--trace", choices=['replacing', 'accumulating'], default=None,
+                        help="trace kind of Q(lambda)/SARSA(lambda) agents (default: replacing)")
+    parser.add_argument("--replay", default=None, type=int,
+                        help="train q/s agents from a replay buffer of this many transitions")
+    parser.add_argument("--replay-every", default=None, type=int,
+                        help="transitions between replayed minibatches (default: 32)")
+    parser.add_argument("--replay-batch", default=None, type=int,
+                        help="transitions per replayed minibatch (default: 256)")
+    parser.add_argument("--prioritized", action="store_true",
+                        help="replay transitions with large TD errors more often")
+    parser.add_argument("--max-nodes", default=None, type=int,
+                        help="positions the n agent may search per move (default: no limit)")
+    parser.add_argument("--time-limit", default=None, type=float,
+                        help="seconds the n agent may search per move (default: no limit)")
+    parser.add_argument("--model", choices=['linear', 'mlp'], default=None,
+                        help="Q-value model of the f agent (default: linear)")
+    parser.add_argument("--hidden", default=None, type=int,
+                        help="hidden units of the f agent's mlp model (default: 64)")
+    parser.add_argument("--board", choices=list(BOARD_CONFIGS), default='3x3-k3',
+                        help="board as rows x columns and marks in a row to win (default: 3x3-k3)")
+    parser.add_argument("--metrics-interval", default=None, type=float,
+                        help="seconds between training metric summaries, with TICTACTOE_METRICS=1 (default: 10)")
 
     args = parser.parse_args()
 
     if args.path is None:
-        args.path = 'q_agent.pkl' if args.agent == 'q' else 'sarsa_agent.pkl' if args.agent == 's' else 'v_agent.pkl' if args.agent == 'v' else 'p_agent.pkl' 
+        args.path = 'q_agent.pkl' if args.agent_type == 'q' else 'sarsa_agent.pkl' if args.agent_type == 's' else 'v_agent.pkl' if args.agent_type == 'v' else 'p_agent.pkl' if args.agent_type == 'p' else 'fa_agent.pkl' if args.agent_type == 'f' else 'negamax_agent.pkl'
 
     gl = GameLearning(args)
 
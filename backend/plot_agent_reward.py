@@ -1,14 +1,15 @@
 import argparse
 import os
-import pickle
 import sys
-import numpy as np
 import matplotlib.pylab as plt
 
+from tictactoe.agent import Learner
+from tictactoe.history import RewardHistory, history_path
 
-def plot_agent_reward(rewards):
-    #  Function to plot agent's reward vs iteration
-    plt.plot(np.cumsum(rewards))
+
+def plot_agent_reward(history):
+    #  Function to plot agent's cumulative reward vs episode
+    plt.plot(history.cumulative())
     plt.title('Agent Cumulative Reward vs. Iteration')
     plt.ylabel('Reward')
     plt.xlabel('Episode')
@@ -21,10 +22,13 @@ if __name__ == "__main__":
     parser.add_argument("-p", "--path", type=str, required=True)
     args = parser.parse_args()
 
-    if not os.path.isfile(args.path):
+    if os.path.isfile(history_path(args.path)):
+        history = RewardHistory.load(history_path(args.path))
+    elif os.path.isfile(args.path):
+        # Agent saved before the history moved out of the pickle
+        history = Learner.load(args.path).history
+    else:
         print("Cannot load agent: file does not exist. Quitting.")
         sys.exit(0)
-    with open(args.path, 'rb') as f:
-        agent = pickle.load(f)
 
-    plot_agent_reward(agent.rewards)
\ No newline at end of file
+    plot_agent_reward(history)
\ No newline at end of file
@@ -0,0 +1,20 @@
+import os
+import stat
+
+from tictactoe.agent import Qlearner
+from tictactoe.history import history_path
+
+
+def test_saved_files_get_the_usual_permissions(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        path = str(tmp_path / 'q_agent.pkl')
+        Qlearner(0.5, 0.9, 0.1).save(path)
+        for saved in (path, history_path(path)):
+            assert stat.S_IMODE(os.stat(saved).st_mode) == 0o644
+        # Replacing a file keeps its mode
+        os.chmod(path, 0o640)
+        Qlearner(0.5, 0.9, 0.1).save(path)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    finally:
+        os.umask(umask)
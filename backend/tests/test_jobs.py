@@ -0,0 +1,53 @@
+import os
+import queue
+import threading
+
+import pytest
+
+from tictactoe.agent import ApproxQlearner, Learner, NegamaxAgent
+from tictactoe.jobs import TrainingJobs, run_training
+
+
+def _run(spec):
+    events = queue.Queue()
+    result = run_training('job', spec, events, threading.Event(), progress_interval=0.)
+    return result, [events.get_nowait() for _ in range(events.qsize())]
+
+
+@pytest.mark.parametrize('load_existing', [False, True])
+def test_function_approximation_jobs_train_and_save(tmp_path, load_existing):
+    spec = {'agent_type': 'f', 'path': str(tmp_path / 'fa_agent.pkl'), 'method': 'self_play',
+            'episodes': 200, 'load_existing': load_existing}
+    if load_existing:
+        ApproxQlearner().save(spec['path'])
+    result, events = _run(spec)
+    assert result == 'complete'
+    assert events[-1][1] == 'progress' and events[-1][2]['episodes'] == 200
+    assert isinstance(Learner.load(spec['path']), ApproxQlearner)
+
+
+def test_negamax_jobs_save_without_episodes(tmp_path):
+    spec = {'agent_type': 'n', 'path': str(tmp_path / 'negamax_agent.pkl'), 'method': 'teacher',
+            'episodes': 200, 'load_existing': False}
+    result, events = _run(spec)
+    assert result == 'complete' and events == []
+    assert isinstance(Learner.load(spec['path']), NegamaxAgent)
+
+
+def test_unknown_agent_types_are_rejected_before_queueing(tmp_path):
+    jobs = TrainingJobs()
+    with pytest.raises(ValueError, match="Unknown agent type"):
+        jobs.submit({'agent_type': 'x', 'path': str(tmp_path / 'x.pkl')})
+    # No worker processes were started for the bad request
+    assert jobs.pool is None and len(jobs) == 0
+
+
+def test_shutdown_cancels_jobs_and_stops_the_workers(tmp_path):
+    jobs = TrainingJobs(max_workers=1, progress_interval=60.)
+    spec = {'agent_type': 'q', 'path': str(tmp_path / 'q_agent.pkl'), 'method': 'self_play',
+            'episodes': 10 ** 7, 'load_existing': False}
+    futures = [jobs.jobs[jobs.submit(spec)]['future'] for _ in range(2)]
+    jobs.shutdown()
+    assert jobs.pool is None
+    assert all(future.done() for future in futures)
+    assert not os.path.exists(spec['path'])
@@ -0,0 +1,51 @@
+"""
+Conversions between the dict and array Q stores.
+
+Run from backend/: python -m pytest tests
+"""
+import math
+import random
+
+from tictactoe.agent import Learner, Qlearner
+from tictactoe.game import Game
+from tictactoe.qtable import ArrayQTable, DictQTable, convert_q_table
+from tictactoe.teacher import Teacher
+
+
+def _trained_dict_agent():
+    random.seed(0)
+    agent = Qlearner(0.5, 0.9, 0.1)
+    teacher = Teacher()
+    for _ in range(500):
+        Game(agent, player=teacher, player_type='teacher').start()
+    return agent
+
+
+def test_dict_array_round_trip_keeps_values_and_adds_no_infinities():
+    agent = _trained_dict_agent()
+    original = {(a, s): v for a, column in agent.Q.items() for s, v in column.items()}
+    Q = convert_q_table(convert_q_table(agent.Q, 'array'), 'dict')
+
+    assert isinstance(Q, DictQTable)
+    for (a, s), v in original.items():
+        # The array store holds float32
+        assert math.isclose(Q[a][s], v, rel_tol=1e-6, abs_tol=1e-6)
+    for a, column in Q.items():
+        for s, v in column.items():
+            assert math.isfinite(v)
+            assert (a, s) in original or v == 0
+
+
+def test_loaded_dict_agent_serves_from_array_and_trains_on_dict(tmp_path):
+    agent = _trained_dict_agent()
+    path = str(tmp_path / 'q_agent.pkl')
+    agent.save(path)
+
+    loaded = Learner.load(path, mmap_mode='c')
+    assert isinstance(loaded.Q, ArrayQTable)
+    assert loaded.q_store == 'dict'
+    loaded.resume_training()
+    assert isinstance(loaded.Q, DictQTable)
+    assert all(math.isfinite(v) for column in loaded.Q.values() for v in column.values())
+    state = '-' * 9
+    assert loaded.max_q(state) == agent.max_q(state)
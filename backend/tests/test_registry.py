@@ -0,0 +1,31 @@
+from tictactoe.agent import Learner, Qlearner, ValueIterationAgent
+from tictactoe.history import history_path
+from tictactoe.registry import AgentRegistry
+
+
+def test_agents_reload_with_their_history_once_the_agent_file_changes(tmp_path):
+    path = str(tmp_path / 'q_agent.pkl')
+    agent = Qlearner(0.5, 0.9, 0.1)
+    agent.history.record(1.)
+    agent.save(path)
+    loads = []
+    registry = AgentRegistry({'q': path}, lambda agent_type, p: loads.append(p) or Learner.load(p))
+    assert len(registry.get('q').history.recent(10)) == 1
+
+    # A new history alone, as between the two writes of a save, is not picked up
+    agent.history.record(-1.)
+    agent.history.save(history_path(path))
+    assert len(registry.get('q').history.recent(10)) == 1 and len(loads) == 1
+
+    agent.save(path)
+    assert len(registry.get('q').history.recent(10)) == 2 and len(loads) == 2
+
+
+def test_planner_tablebases_are_built_when_loaded(tmp_path):
+    path = str(tmp_path / 'v_agent.pkl')
+    agent = ValueIterationAgent(gamma=0.9)
+    agent.compute_value_iteration()
+    agent.save(path)
+    registry = AgentRegistry({'v': path}, lambda agent_type, p: Learner.load(p))
+    registry.warm()
+    assert registry.get('v')._tablebase is not None
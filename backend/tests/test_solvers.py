@@ -0,0 +1,21 @@
+"""
+Value and Policy Iteration on boards other than 3x3.
+
+Run from backend/: python -m pytest tests
+"""
+from tictactoe.agent import PolicyIterationAgent, ValueIterationAgent
+from tictactoe.bitboard import parse_shape
+from tictactoe.states import solver_states
+
+
+def test_sweep_policy_iteration_matches_retrograde_on_3x4():
+    shape = parse_shape('3x4-k3')
+    pi = PolicyIterationAgent(gamma=0.9, theta=1e-6, shape=shape)
+    pi.compute_policy_iteration(method='sweep')
+    vi = ValueIterationAgent(gamma=0.9, shape=shape)
+    vi.compute_value_iteration(method='retrograde')
+
+    # PI's values are those of its final policy, so matching the exact values
+    # means the policy is optimal as well
+    space = solver_states(False, shape)
+    assert max(abs(pi.V[key] - vi.V[key]) for key in space.keys) < 1e-4
@@ -0,0 +1,35 @@
+"""
+Zobrist hashes and the state key cache.
+
+Run from backend/: python -m pytest tests
+"""
+import random
+
+from tictactoe.agent import Qlearner
+from tictactoe.bitboard import parse_shape
+from tictactoe.game import Game
+from tictactoe.teacher import Teacher
+from tictactoe.zobrist import KeyCache, key_cache, zobrist
+
+
+def test_key_cache_stays_within_its_bound():
+    shape = parse_shape('4x4-k3')
+    cache = KeyCache(zobrist(shape), max_positions=100)
+    random.seed(0)
+    agent = Qlearner(0.5, 0.9, 0.2, shape=shape)
+    teacher = Teacher(shape=shape)
+    for _ in range(200):
+        game = Game(agent, player=teacher, player_type='teacher', shape=shape)
+        game.keys = cache
+        game.start()
+        assert len(cache.entries) <= 100
+        assert game.stateKey() == shape.to_key(game.x, game.o)
+        assert game.hash == cache.zobrist.hash(game.x, game.o)
+    assert cache.misses > 100
+    assert cache.collisions == 0
+
+
+def test_shared_key_caches_are_small():
+    # One cache per board lives for the whole process
+    for name in ('3x3-k3', '7x6-k4'):
+        assert key_cache(parse_shape(name)).max_positions <= 4096
@@ -1,49 +1,232 @@
 from abc import ABC, abstractmethod
 import os
 import pickle
-import collections
 import numpy as np
 import random
+import time
 from collections import defaultdict
 
+from . import agentfile, bitboard, metrics, qnet, symmetry
+from .history import RewardHistory, history_path
+from .mdp import compiled_mdp, landing_rewards
+from .qtable import ArrayQTable, DictQTable, convert_q_table, make_q_table
+from .replay import ReplayBuffer
+from .bitboard import STANDARD, parse_shape
+from .states import game_states, solver_states
+from .tablebase import Tablebase
+
+# Transposition table bounds of the search agent
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+_INFINITY = 100
+
+
+class _OutOfBudget(Exception):
+    pass
+
 
 class Learner(ABC):
     # Parent class for Q-learning and SARSA agents.
-    def __init__(self, alpha, gamma, eps, eps_decay=0.):
+    # q_store picks the Q-value store: 'dict' (one dict per action) or
+    # 'array' (a float32 array over the game state index), see qtable.py.
+    # With symmetry, rotated and mirrored positions share one Q entry.
+    # shape is the board (bitboard.Shape); boards other than 3x3 need the
+    # dict store and no symmetry.
+    def __init__(self, alpha, gamma, eps, eps_decay=0., q_store='dict', symmetry=False,
+                 shape=STANDARD):
+        if symmetry and not shape.standard:
+            raise ValueError("Symmetry is only supported on the 3x3 board")
         self.alpha = alpha
         self.gamma = gamma
         self.eps = eps
         self.eps_decay = eps_decay
+        self.symmetry = symmetry
+        self.shape = shape
         self.actions = []
-        for i in range(3):
-            for j in range(3):
+        for i in range(shape.rows):
+            for j in range(shape.cols):
                 self.actions.append((i,j))
-        self.Q = {}
-        for action in self.actions:
-            self.Q[action] = collections.defaultdict(int)
-        self.rewards = []
+        self.q_store = q_store
+        self.Q = make_q_table(q_store, shape)
+        # Episode outcomes, saved next to the agent file (see history.py)
+        self.history = RewardHistory()
+        # Experience replay, off unless use_replay is called; not saved
+        self.replay = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('history', None)
+        state.pop('replay', None)
+        state.pop('_tablebase', None)
+        return state
+
+    def __setstate__(self, state):
+        # Agents pickled before the Q stores existed hold a plain dict
+        if type(state.get('Q')) is dict:
+            state['Q'] = DictQTable(state['Q'])
+        state.setdefault('symmetry', False)
+        state.setdefault('shape', STANDARD)
+        state.setdefault('replay', None)
+        state.setdefault('q_store', 'array' if isinstance(state.get('Q'), ArrayQTable) else 'dict')
+        # Older agents kept every step reward in a list
+        rewards = state.pop('rewards', None)
+        state['history'] = RewardHistory.from_legacy(rewards) if rewards else RewardHistory()
+        self.__dict__.update(state)
+
+    def use_q_store(self, kind):
+        """ Switch Q to the given store kind, migrating the learned values. """
+        if kind == 'array' and not self.shape.standard:
+            raise ValueError("The array Q store only supports the 3x3 board")
+        self.Q = convert_q_table(self.Q, kind)
+        self.q_store = kind
+
+    def resume_training(self):
+        """
+        Get a loaded agent ready to train. Loaded agents serve from the array
+        mapped from their file whatever their store; a dict-store agent gets
+        its dict back here, so loading for play never pays for the rebuild.
+        """
+        if isinstance(getattr(self, 'Q', None), ArrayQTable) and self.q_store == 'dict':
+            self.Q = convert_q_table(self.Q, 'dict')
+
+    def prepare_for_play(self):
+        """
+        Build now what ``get_action`` would otherwise build on its first call,
+        so the first move costs no more than the rest. Nothing for most agents.
+        """
+
+    def use_replay(self, capacity, every=32, batch_size=256, prioritized=False, rng=None):
+        """
+        Learn from replayed experience instead of each transition as it comes.
+
+        From now on ``update`` stores transitions in a ``ReplayBuffer`` of
+        ``capacity``, and every ``every`` transitions a minibatch of
+        ``batch_size`` is drawn and applied with ``update_batch``. Switches
+        Q to the array store; needs the 3x3 board and no symmetry.
+        """
+        if self.symmetry or not self.shape.standard:
+            raise ValueError("Replay is only supported on the 3x3 board without symmetry")
+        self.use_q_store('array')
+        self.replay = ReplayBuffer(capacity, prioritized, rng=rng)
+        self.replay_every = every
+        self.replay_batch_size = batch_size
+
+    def remember(self, s, s_, a, a_, r):
+        # update with replay on: store the transition, replay every few steps
+        index = self.Q.index
+        done = s_ is None
+        self.replay.add(index[s], bitboard.cell_of(a), r,
+                        -1 if done else index[s_], 0 if a_ is None else bitboard.cell_of(a_), done)
+        if done:
+            self.history.record(r)
+        if not self.replay.added % self.replay_every:
+            self.replay_step()
+
+    @metrics.timed('tictactoe_replay_seconds', 'Latency of one replayed minibatch', metrics.AGENT_LABEL)
+    def replay_step(self):
+        """ Apply one minibatch drawn from the replay buffer. """
+        slots, weights = self.replay.sample(self.replay_batch_size)
+        s, s_, a, a_, r = self.replay.batch(slots)
+        targets = self.td_targets(s, s_, a, a_, r)
+        values = self.Q.table[s, a].astype(np.float64)
+        # Importance weights scale the step: value + alpha*w*(target - value)
+        self.Q.update_batch(s, a, values + weights*(targets - values), self.alpha)
+        self.replay.update_priorities(slots, targets - values)
+
+    def q_key(self, s, a):
+        # The (state, action) entry of Q that holds this pair
+        if self.symmetry:
+            key, _, actions = symmetry.canonical(s)
+            return key, actions[a]
+        return s, a
+
+    def max_q(self, s):
+        if self.symmetry:
+            key, _, actions = symmetry.canonical(s)
+            return max(self.Q.value(key, c) for c in actions.values())
+        return self.Q.max_value(s)
 
+    @metrics.timed('tictactoe_get_action_seconds', 'Latency of get_action', metrics.AGENT_LABEL)
     def get_action(self, s):
-        possible_actions = [a for a in self.actions if s[a[0]*3 + a[1]] == '-']
+        possible_actions = self.shape.legal_actions(s)
         if random.random() < self.eps:
             action = possible_actions[random.randint(0,len(possible_actions)-1)]
         else:
-            values = np.array([self.Q[a][s] for a in possible_actions])
-            ix_max = np.where(values == np.max(values))[0]
-            if len(ix_max) > 1:
-                ix_select = np.random.choice(ix_max, 1)[0]
+            if self.symmetry:
+                key, _, actions = symmetry.canonical(s)
+                values = [self.Q.value(key, actions[a]) for a in possible_actions]
+                best = max(values)
+                best_actions = [a for a, v in zip(possible_actions, values) if v == best]
             else:
-                ix_select = ix_max[0]
-            action = possible_actions[ix_select]
+                best_actions = self.Q.best_actions(s)
+            if len(best_actions) > 1:
+                action = best_actions[np.random.choice(len(best_actions), 1)[0]]
+            else:
+                action = best_actions[0]
         self.eps *= (1.-self.eps_decay)
         return action
 
     def save(self, path):
-        if os.path.isfile(path):
-            os.remove(path)
-        f = open(path, 'wb')
-        pickle.dump(self, f)
-        f.close()
+        # Write the agent file atomically, see agentfile.py. The reward
+        # history goes first: AgentRegistry reloads on a change to the agent
+        # file alone, so once that is replaced both files are ready.
+        params, index, arrays = self.file_contents()
+        self.history.save(history_path(path))
+        agentfile.write(path, {'agent': type(self).__name__, 'params': params, 'index': index}, arrays)
+
+    @staticmethod
+    def load(path, mmap_mode='r'):
+        # Load an agent saved with save, along with its reward history.
+        # Arrays are mapped from the file: 'r' for play only, 'c' to keep
+        # training (changes stay in memory). Pickled agents are imported.
+        if agentfile.is_agent_file(path):
+            header, arrays = agentfile.read(path, mmap_mode)
+            agent = AGENTS[header['agent']].from_file(header, arrays)
+        else:
+            with open(path, 'rb') as f:
+                agent = pickle.load(f)
+        if os.path.isfile(history_path(path)):
+            agent.history = RewardHistory.load(history_path(path))
+        return agent
+
+    def file_contents(self):
+        # (hyperparameters, state index, arrays) stored in the agent file.
+        # A dict Q is stored as float64 so it reloads without rounding.
+        # Other boards have no state index; their Q entries are stored as
+        # parallel arrays of state keys, cells and values.
+        params = {'alpha': self.alpha, 'gamma': self.gamma, 'eps': self.eps,
+                  'eps_decay': self.eps_decay, 'q_store': self.q_store, 'symmetry': self.symmetry,
+                  'shape': self.shape.name}
+        if not self.shape.standard:
+            entries = [(s, self.shape.cell_of(a), v) for a, column in self.Q.items()
+                       for s, v in column.items()]
+            keys, cells, values = zip(*entries) if entries else ((), (), ())
+            return params, None, {
+                'keys': np.array(keys, dtype=f'S{self.shape.size}'),
+                'cells': np.array(cells, dtype=np.int16),
+                'values': np.array(values, dtype=np.float64)}
+        if isinstance(self.Q, ArrayQTable):
+            table = self.Q.table
+        else:
+            table = ArrayQTable.from_dict(self.Q, np.float64).table
+        return params, agentfile.index_header(game_states(), 'game'), {'q': table}
+
+    @classmethod
+    def from_file(cls, header, arrays):
+        params = dict(header['params'])
+        q_store = params.pop('q_store')
+        params['shape'] = parse_shape(params.get('shape', STANDARD.name))
+        agent = cls(**params)
+        agent.q_store = q_store
+        if not agent.shape.standard:
+            action_of = agent.shape.action_of
+            for s, cell, v in zip(arrays['keys'].tolist(), arrays['cells'].tolist(),
+                                  arrays['values'].tolist()):
+                agent.Q[action_of(cell)][s.decode()] = v
+            return agent
+        agentfile.check_index(header['index'], game_states())
+        # Served straight from the mapped array; see resume_training
+        agent.Q = ArrayQTable.from_array(arrays['q'])
+        return agent
 
     @abstractmethod
     def update(self, s, s_, a, a_, r):
@@ -52,30 +235,256 @@ class Learner(ABC):
 
 class Qlearner(Learner):
     # A class to implement the Q-learning agent.
-    def __init__(self, alpha, gamma, eps, eps_decay=0.):
-        super().__init__(alpha, gamma, eps, eps_decay)
+    def __init__(self, alpha, gamma, eps, eps_decay=0., q_store='dict', symmetry=False,
+                 shape=STANDARD):
+        super().__init__(alpha, gamma, eps, eps_decay, q_store, symmetry, shape)
 
+    @metrics.timed('tictactoe_update_seconds', 'Latency of update', metrics.AGENT_LABEL)
     def update(self, s, s_, a, a_, r):
+        if self.replay is not None:
+            return self.remember(s, s_, a, a_, r)
         if s_ is not None:
-            possible_actions = [action for action in self.actions if s_[action[0]*3 + action[1]] == '-']
-            Q_options = [self.Q[action][s_] for action in possible_actions]
-            self.Q[a][s] += self.alpha*(r + self.gamma*max(Q_options) - self.Q[a][s])
+            self.Q.update(*self.q_key(s, a), r + self.gamma*self.max_q(s_), self.alpha)
         else:
-            self.Q[a][s] += self.alpha*(r - self.Q[a][s])
-        self.rewards.append(r)
+            self.Q.update(*self.q_key(s, a), r, self.alpha)
+            self.history.record(r)
+
+    @metrics.timed('tictactoe_update_batch_seconds', 'Latency of update_batch', metrics.AGENT_LABEL)
+    def update_batch(self, s, s_, a, a_, r):
+        # Array form of update for the batched trainer (see vecenv.py): s and s_
+        # are dense state ids (s_ is -1 when the episode ended), a and a_ cells.
+        # Needs the 'array' Q store.
+        self.Q.update_batch(s, a, self.td_targets(s, s_, a, a_, r), self.alpha)
+        self.history.record_many(r[s_ < 0])
+
+    def td_targets(self, s, s_, a, a_, r):
+        # r + gamma * max Q(s_) for arrays of transitions, as update_batch takes them
+        done = s_ < 0
+        future = self.Q.table[np.where(done, 0, s_)].max(axis=1).astype(np.float64)
+        return r + np.where(done, 0., self.gamma*future)
 
 
 class SARSAlearner(Learner):
     # A class to implement the SARSA agent.
-    def __init__(self, alpha, gamma, eps, eps_decay=0.):
-        super().__init__(alpha, gamma, eps, eps_decay)
+    def __init__(self, alpha, gamma, eps, eps_decay=0., q_store='dict', symmetry=False,
+                 shape=STANDARD):
+        super().__init__(alpha, gamma, eps, eps_decay, q_store, symmetry, shape)
 
+    @metrics.timed('tictactoe_update_seconds', 'Latency of update', metrics.AGENT_LABEL)
     def update(self, s, s_, a, a_, r):
+        if self.replay is not None:
+            return self.remember(s, s_, a, a_, r)
         if s_ is not None:
-            self.Q[a][s] += self.alpha*(r + self.gamma*self.Q[a_][s_] - self.Q[a][s])
+            self.Q.update(*self.q_key(s, a), r + self.gamma*self.Q.value(*self.q_key(s_, a_)), self.alpha)
+        else:
+            self.Q.update(*self.q_key(s, a), r, self.alpha)
+            self.history.record(r)
+
+    @metrics.timed('tictactoe_update_batch_seconds', 'Latency of update_batch', metrics.AGENT_LABEL)
+    def update_batch(self, s, s_, a, a_, r):
+        # Array form of update for the batched trainer, see Qlearner.update_batch
+        self.Q.update_batch(s, a, self.td_targets(s, s_, a, a_, r), self.alpha)
+        self.history.record_many(r[s_ < 0])
+
+    def td_targets(self, s, s_, a, a_, r):
+        # r + gamma * Q(s_, a_) for arrays of transitions
+        done = s_ < 0
+        future = self.Q.table[np.where(done, 0, s_), np.where(done, 0, a_)].astype(np.float64)
+        return r + np.where(done, 0., self.gamma*future)
+
+
+class TraceLearner(Learner):
+    # Parent class of the eligibility-trace agents, Q(lambda) and SARSA(lambda).
+    # Each step's TD error is applied to every (state, action) pair visited
+    # this episode, weighted by its trace, so a reward reaches the moves
+    # that led to it within one episode. Traces are kept sparsely, as a dict
+    # of the pairs visited this episode, and decay by gamma*lam per step;
+    # those below TRACE_MIN are dropped. trace is 'replacing' (a visit sets
+    # the trace to 1) or 'accumulating' (a visit adds 1).
+    TRACE_MIN = 1e-3
+
+    def __init__(self, alpha, gamma, eps, eps_decay=0., lam=0.8, trace='replacing', q_store='dict',
+                 symmetry=False, shape=STANDARD):
+        if trace not in ('replacing', 'accumulating'):
+            raise ValueError("Unknown trace kind")
+        super().__init__(alpha, gamma, eps, eps_decay, q_store, symmetry, shape)
+        self.lam = lam
+        self.trace = trace
+        # Q entry (state key, action) -> trace, for the current episode
+        self.traces = {}
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.traces = {}
+
+    def apply_traces(self, s, a, delta):
+        # Visit the (s, a) entry, then move every traced entry by alpha*delta*trace
+        key = self.q_key(s, a)
+        if self.trace == 'replacing':
+            self.traces[key] = 1.
+        else:
+            self.traces[key] = self.traces.get(key, 0.) + 1.
+        decay = self.gamma*self.lam
+        traces = {}
+        for (ks, ka), e in self.traces.items():
+            self.Q.update(ks, ka, self.Q.value(ks, ka) + delta*e, self.alpha)
+            if e*decay >= self.TRACE_MIN:
+                traces[ks, ka] = e*decay
+        self.traces = traces
+
+    def end_episode(self, r):
+        self.traces = {}
+        self.history.record(r)
+
+    def file_contents(self):
+        params, index, arrays = super().file_contents()
+        params.update(lam=self.lam, trace=self.trace)
+        return params, index, arrays
+
+
+class QLambdaLearner(TraceLearner):
+    # Watkins's Q(lambda): Q-learning targets, with the traces cut whenever
+    # the next action is exploratory, since the return after it no longer
+    # follows the greedy policy being learned.
+    @metrics.timed('tictactoe_update_seconds', 'Latency of update', metrics.AGENT_LABEL)
+    def update(self, s, s_, a, a_, r):
+        value = self.Q.value(*self.q_key(s, a))
+        if s_ is None:
+            self.apply_traces(s, a, r - value)
+            return self.end_episode(r)
+        best = self.max_q(s_)
+        greedy = self.Q.value(*self.q_key(s_, a_)) == best
+        self.apply_traces(s, a, r + self.gamma*best - value)
+        if not greedy:
+            self.traces = {}
+
+
+class SARSALambdaLearner(TraceLearner):
+    # SARSA(lambda): SARSA targets, traced back through the actions taken.
+    @metrics.timed('tictactoe_update_seconds', 'Latency of update', metrics.AGENT_LABEL)
+    def update(self, s, s_, a, a_, r):
+        value = self.Q.value(*self.q_key(s, a))
+        if s_ is None:
+            self.apply_traces(s, a, r - value)
+            return self.end_episode(r)
+        self.apply_traces(s, a, r + self.gamma*self.Q.value(*self.q_key(s_, a_)) - value)
+
+
+class ApproxQlearner(Learner):
+    """
+    Q-learning with a function approximator in place of the Q table.
+
+    Q is a linear model or a one-hidden-layer MLP over board features (see
+    qnet.py), so memory and inference cost are fixed by the board size, and
+    what is learned in one position carries over to similar ones.
+    Transitions passed to ``update`` are buffered, and every ``batch_size``
+    of them make one minibatch gradient step, with the targets
+    ``r + gamma * max Q(s_)`` computed in one batched forward pass.
+
+    Parameters
+    ----------
+    alpha : float
+        Learning rate of the gradient steps (default: 0.01)
+    gamma : float
+        Discount factor for future rewards (default: 0.9)
+    eps : float
+        Exploration rate (default: 0.1)
+    eps_decay : float
+        Decay of the exploration rate per move (default: 0)
+    model : str
+        'linear' or 'mlp' (default: 'linear')
+    hidden : int
+        Hidden units of the 'mlp' model (default: 64)
+    batch_size : int
+        Transitions per gradient step (default: 32)
+    shape : bitboard.Shape
+        Board to play on (default: the 3x3 board)
+    """
+
+    def __init__(self, alpha=0.01, gamma=0.9, eps=0.1, eps_decay=0., model='linear', hidden=64,
+                 batch_size=32, shape=STANDARD):
+        super().__init__(alpha, gamma, eps, eps_decay, shape=shape)
+        # No Q table: the model gives the Q-values
+        self.Q = None
+        self.hidden = hidden
+        self.batch_size = batch_size
+        self.model = qnet.make_model(model, shape.size, hidden)
+        # Transitions waiting for the next gradient step: (s, cell, r, s_)
+        self.buffer = []
+
+    def q_values(self, states):
+        """
+        Q-values of the cells of many states in one forward pass.
+
+        Parameters
+        ----------
+        states : list of str
+            State keys
+
+        Returns
+        -------
+        numpy.ndarray
+            ``float32[len(states), cells]``, -inf for occupied cells
+        """
+        X = qnet.features(states, self.shape.size)
+        return np.where(qnet.legal_mask(X, self.shape.size), self.model.forward(X), -np.inf)
+
+    def max_q(self, s):
+        return float(self.q_values([s])[0].max())
+
+    @metrics.timed('tictactoe_get_action_seconds', 'Latency of get_action', metrics.AGENT_LABEL)
+    def get_action(self, s):
+        if random.random() < self.eps:
+            possible_actions = self.shape.legal_actions(s)
+            action = possible_actions[random.randint(0,len(possible_actions)-1)]
         else:
-            self.Q[a][s] += self.alpha*(r - self.Q[a][s])
-        self.rewards.append(r)
+            values = self.q_values([s])[0]
+            best_cells = np.flatnonzero(values == values.max())
+            if len(best_cells) > 1:
+                action = self.shape.action_of(int(best_cells[np.random.choice(len(best_cells), 1)[0]]))
+            else:
+                action = self.shape.action_of(int(best_cells[0]))
+        self.eps *= (1.-self.eps_decay)
+        return action
+
+    @metrics.timed('tictactoe_update_seconds', 'Latency of update', metrics.AGENT_LABEL)
+    def update(self, s, s_, a, a_, r):
+        self.buffer.append((s, self.shape.cell_of(a), r, s_))
+        if s_ is None:
+            self.history.record(r)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Take a gradient step on the buffered transitions, if any."""
+        if not self.buffer:
+            return
+        states, cells, rewards, next_states = zip(*self.buffer)
+        self.buffer = []
+        targets = np.array(rewards, dtype=np.float32)
+        going = [i for i, s_ in enumerate(next_states) if s_ is not None]
+        if going:
+            future = self.q_values([next_states[i] for i in going]).max(axis=1)
+            targets[going] += self.gamma*future
+        X = qnet.features(states, self.shape.size)
+        self.model.step(X, np.array(cells), targets, self.alpha)
+
+    def file_contents(self):
+        # The model weights; buffered transitions are learned from first
+        self.flush()
+        params = {'alpha': self.alpha, 'gamma': self.gamma, 'eps': self.eps,
+                  'eps_decay': self.eps_decay, 'model': self.model.kind, 'hidden': self.hidden,
+                  'batch_size': self.batch_size, 'shape': self.shape.name}
+        return params, None, self.model.arrays()
+
+    @classmethod
+    def from_file(cls, header, arrays):
+        params = dict(header['params'])
+        params['shape'] = parse_shape(params.get('shape', STANDARD.name))
+        agent = cls(**params)
+        agent.model = qnet.MODELS[params['model']].from_arrays(arrays)
+        return agent
+
 
 class ValueIterationAgent(Learner):
     """
@@ -91,11 +500,20 @@ class ValueIterationAgent(Learner):
         Discount factor for future rewards (default: 0.9)
     theta : float
         Convergence criterion - threshold for value function updates (default: 0.001)
+    symmetry : bool
+        Solve over one position per rotation/reflection class and look moves
+        up through the canonical board (default: False)
+    shape : bitboard.Shape
+        Board to solve (default: the 3x3 board). The solver enumerates every
+        position, so boards with more than ``states.MAX_STATES`` positions
+        are refused with a ValueError.
     """
     
-    def __init__(self, gamma=0.9, theta=0.001):
+    def __init__(self, gamma=0.9, theta=0.001, symmetry=False, shape=STANDARD):
         # Note: We pass None for alpha and 0 for eps since VI doesn't use these
-        super().__init__(alpha=None, gamma=gamma, eps=0, eps_decay=0)
+        super().__init__(alpha=None, gamma=gamma, eps=0, eps_decay=0, symmetry=symmetry,
+                         shape=shape)
+        solver_states(symmetry, shape)  # Refuses boards too large to enumerate
         self.theta = theta
         
         # State values V(s)
@@ -104,16 +522,19 @@ class ValueIterationAgent(Learner):
         # Optimal policy π*(s) -> a
         self.policy = {}
         
-        # Store rewards for visualization (inherited from Learner)
-        self.rewards = []
+        # Episode outcomes (unused by the planning agents)
+        self.history = RewardHistory()
         
         # Initialize possible actions (same as parent class)
-        self.actions = [(i, j) for i in range(3) for j in range(3)]
+        self.actions = [(i, j) for i in range(shape.rows) for j in range(shape.cols)]
 
     def get_state_value(self, state):
         """Get value of a state."""
+        if self.symmetry:
+            return self.V[symmetry.canonical_key(state)]
         return self.V[state]
 
+    @metrics.timed('tictactoe_get_action_seconds', 'Latency of get_action', metrics.AGENT_LABEL)
     def get_action(self, state):
         """
         Get the optimal action for the given state based on computed policy.
@@ -128,119 +549,153 @@ class ValueIterationAgent(Learner):
         tuple
             (row, col) action to take
         """
+        # Positions with 'O' to move are answered from the flat tablebase
+        if self.shape.standard:
+            x, o = bitboard.from_key(state)
+            cell = self.tablebase().best_move(o, x)
+            if cell >= 0:
+                return bitboard.action_of(cell)
+
+        action = _planner_policy_action(self, state)
         # If state not in policy (shouldn't happen after training), return random action
-        if state not in self.policy:
-            possible_actions = [a for a in self.actions if state[a[0]*3 + a[1]] == '-']
+        if action is None:
+            possible_actions = self.shape.legal_actions(state)
             if possible_actions:
                 return possible_actions[np.random.randint(len(possible_actions))]
             return self.actions[0]  # Fallback
             
-        return self.policy[state]
+        return action
+
+    def tablebase(self):
+        """
+        The policy's moves for 'O' with game-theoretic values, as a
+        ``Tablebase`` (see tablebase.py). Built on first use and again after
+        the policy is recomputed. 3x3 board only.
+        """
+        if not self.shape.standard:
+            raise ValueError("Tablebases are only built for the 3x3 board")
+        if getattr(self, '_tablebase', None) is None:
+            self._tablebase = _planner_tablebase(self)
+        return self._tablebase
+
+    def prepare_for_play(self):
+        # The tablebase takes about 0.1 s to build, a move from it microseconds
+        if self.shape.standard:
+            self.tablebase()
 
-    def compute_value_iteration(self):
+    def compute_value_iteration(self, method='sweep'):
         """
         Run the value iteration algorithm to compute optimal value function and policy.
+        Sweeps run over the shared state index, so no board strings are built
+        or checked inside the loop.
+
+        Parameters
+        ----------
+        method : str
+            'sweep' for in-place Python sweeps, 'vectorized' to run each sweep
+            as one NumPy max-reduction over the compiled model, 'retrograde'
+            for one exact backward pass from full boards to the empty board,
+            which ignores ``theta`` (default: 'sweep')
+
+        Returns the number of sweeps taken.
         """
+        if method == 'retrograde':
+            self._tablebase = None
+            mdp = compiled_mdp(self.symmetry, self.shape)
+            values, cells, _ = mdp.retrograde(self.gamma)
+            self.V.update(zip(mdp.space.keys, values.tolist()))
+            self.policy.update(mdp.policy_dict(cells))
+            return 1
+        if method == 'vectorized':
+            mdp = compiled_mdp(self.symmetry, self.shape)
+            values = np.array([self.V[key] for key in mdp.space.keys])
+            values, iteration = mdp.value_iteration(self.gamma, self.theta, values)
+            self.V.update(zip(mdp.space.keys, values.tolist()))
+            self.compute_policy(method)
+            return iteration
+        if method != 'sweep':
+            raise ValueError("Unknown method")
+
+        space = solver_states(self.symmetry, self.shape)
+        successors = space.successors['X']
+        rewards = landing_rewards(space)
+        values = [self.V[key] for key in space.keys]
+        states = space.nonterminal()
+
         iteration = 0
         while True:
             delta = 0  # Keep track of maximum value change
-            
-            # Iterate through all states
-            for state in self.get_all_states():
-                old_value = self.V[state]
-                
-                # Skip terminal states (they have fixed values)
-                if self.is_terminal_state(state):
-                    continue
-                
-                # Compute new value using Bellman equation
-                max_value = float('-inf')
-                for action in self.get_valid_actions(state):
-                    value = 0
-                    # Consider all possible next states
-                    next_state = self.get_next_state(state, action)
-                    reward = self.get_reward(state, action, next_state)
-                    value = reward + self.gamma * self.V[next_state]
-                    max_value = max(max_value, value)
-                
-                # Update state value
-                self.V[state] = max_value
-                
-                # Update maximum change
-                delta = max(delta, abs(old_value - self.V[state]))
-            
+
+            for sid in states:
+                # Bellman backup over the successors of every valid action
+                best = max(rewards[n] + self.gamma * values[n]
+                           for n in successors[sid] if n >= 0)
+                delta = max(delta, abs(values[sid] - best))
+                values[sid] = best
+
             iteration += 1
-            
+
             # Check convergence
             if delta < self.theta:
                 break
-        
+
+        self.V.update(zip(space.keys, values))
+
         # Compute optimal policy after value iteration converges
         self.compute_policy()
-        
+
         return iteration
 
-    def compute_policy(self):
+    def compute_policy(self, method='sweep'):
         """
         Compute optimal policy based on the computed value function.
         """
-        for state in self.get_all_states():
-            if self.is_terminal_state(state):
-                continue
-                
+        self._tablebase = None
+        if method == 'vectorized':
+            mdp = compiled_mdp(self.symmetry, self.shape)
+            values = np.array([self.V[key] for key in mdp.space.keys])
+            self.policy.update(mdp.policy_dict(mdp.greedy(values, self.gamma)))
+            return
+        if method != 'sweep':
+            raise ValueError("Unknown method")
+
+        space = solver_states(self.symmetry, self.shape)
+        successors = space.successors['X']
+        rewards = landing_rewards(space)
+        values = [self.V[key] for key in space.keys]
+
+        for sid in space.nonterminal():
             best_action = None
             best_value = float('-inf')
-            
+
             # For each action, compute expected value
-            for action in self.get_valid_actions(state):
-                next_state = self.get_next_state(state, action)
-                value = self.get_reward(state, action, next_state) + \
-                       self.gamma * self.V[next_state]
-                
+            for cell in space.actions[sid]:
+                n = successors[sid][cell]
+                value = rewards[n] + self.gamma * values[n]
                 if value > best_value:
                     best_value = value
-                    best_action = action
-            
-            self.policy[state] = best_action
+                    best_action = cell
+
+            self.policy[space.keys[sid]] = self.shape.action_of(best_action)
 
     def is_terminal_state(self, state):
         """
         Check if the given state is terminal (game over).
-        To be implemented.
-        """
-        # Check for wins
-        for i in range(3):
-            # Check rows
-            if state[i*3:(i+1)*3] in ['XXX', 'OOO']:
-                return True
-            # Check columns
-            if state[i] + state[i+3] + state[i+6] in ['XXX', 'OOO']:
-                return True
-        
-        # Check diagonals
-        if state[0] + state[4] + state[8] in ['XXX', 'OOO']:
-            return True
-        if state[2] + state[4] + state[6] in ['XXX', 'OOO']:
-            return True
-        
-        # Check for draw (no empty spaces)
-        if '-' not in state:
-            return True
-            
-        return False
+        """
+        return self.shape.is_terminal(*self.shape.from_key(state))
 
     def get_valid_actions(self, state):
         """
         Get list of valid actions for the given state.
         """
-        return [(i//3, i%3) for i in range(9) if state[i] == '-']
+        return list(self.shape.legal_actions(state))
 
     def get_next_state(self, state, action):
         """
         Get the next state after taking an action.
         Returns the state string after applying the action.
         """
-        pos = action[0] * 3 + action[1]
+        pos = self.shape.cell_of(action)
         return state[:pos] + 'X' + state[pos+1:]
 
     def get_reward(self, state, action, next_state):
@@ -263,36 +718,22 @@ class ValueIterationAgent(Learner):
 
     def check_win(self, state, player):
         """Check if the specified player has won."""
-        win_patterns = [
-            [0,1,2], [3,4,5], [6,7,8],  # Rows
-            [0,3,6], [1,4,7], [2,5,8],  # Columns
-            [0,4,8], [2,4,6]            # Diagonals
-        ]
-        
-        for pattern in win_patterns:
-            if all(state[i] == player for i in pattern):
-                return True
-        return False
+        x, o = self.shape.from_key(state)
+        return self.shape.is_win(x if player == 'X' else o)
 
     def get_all_states(self):
         """
-        Generate all possible game states.
-        This is a simplified version - you might want to optimize this.
+        Return every state the solver works on, in state id order.
+        The index is enumerated once per process and shared by both solvers.
         """
-        states = set()
-        states.add('-' * 9)  # Empty board
-        
-        # Generate states (this is a simplified version)
-        # In practice, you'd want to generate only valid game states
-        for i in range(9):
-            new_states = set()
-            for state in states:
-                if state[i] == '-':
-                    new_states.add(state[:i] + 'X' + state[i+1:])
-                    new_states.add(state[:i] + 'O' + state[i+1:])
-            states.update(new_states)
-        
-        return states
+        return solver_states(self.symmetry, self.shape).keys
+
+    def file_contents(self):
+        return _planner_file_contents(self)
+
+    @classmethod
+    def from_file(cls, header, arrays):
+        return _planner_from_file(cls, header, arrays)
 
     def update(self, s, s_, a, a_, r):
         """
@@ -315,11 +756,20 @@ class PolicyIterationAgent(Learner):
         Discount factor for future rewards (default: 0.9)
     theta : float
         Convergence criterion - threshold for value function updates (default: 0.001)
+    symmetry : bool
+        Solve over one position per rotation/reflection class and look moves
+        up through the canonical board (default: False)
+    shape : bitboard.Shape
+        Board to solve (default: the 3x3 board). The solver enumerates every
+        position, so boards with more than ``states.MAX_STATES`` positions
+        are refused with a ValueError.
     """
     
-    def __init__(self, gamma=0.9, theta=0.001):
+    def __init__(self, gamma=0.9, theta=0.001, symmetry=False, shape=STANDARD):
         # Note: We pass None for alpha and 0 for eps since PI doesn't use these
-        super().__init__(alpha=None, gamma=gamma, eps=0, eps_decay=0)
+        super().__init__(alpha=None, gamma=gamma, eps=0, eps_decay=0, symmetry=symmetry,
+                         shape=shape)
+        solver_states(symmetry, shape)  # Refuses boards too large to enumerate
         self.theta = theta
         
         # State values V(s)
@@ -328,12 +778,13 @@ class PolicyIterationAgent(Learner):
         # Current policy π(s) -> a
         self.policy = {}
         
-        # Store rewards for visualization (inherited from Learner)
-        self.rewards = []
+        # Episode outcomes (unused by the planning agents)
+        self.history = RewardHistory()
         
         # Initialize possible actions (same as parent class)
-        self.actions = [(i, j) for i in range(3) for j in range(3)]
+        self.actions = [(i, j) for i in range(shape.rows) for j in range(shape.cols)]
 
+    @metrics.timed('tictactoe_get_action_seconds', 'Latency of get_action', metrics.AGENT_LABEL)
     def get_action(self, state):
         """
         Get the optimal action for the given state based on computed policy.
@@ -348,145 +799,185 @@ class PolicyIterationAgent(Learner):
         tuple
             (row, col) action to take
         """
+        # Positions with 'O' to move are answered from the flat tablebase
+        if self.shape.standard:
+            x, o = bitboard.from_key(state)
+            cell = self.tablebase().best_move(o, x)
+            if cell >= 0:
+                return bitboard.action_of(cell)
+
+        action = _planner_policy_action(self, state)
         # If state not in policy (shouldn't happen after training), return random action
-        if state not in self.policy:
-            possible_actions = [a for a in self.actions if state[a[0]*3 + a[1]] == '-']
+        if action is None:
+            possible_actions = self.shape.legal_actions(state)
             if possible_actions:
                 return possible_actions[np.random.randint(len(possible_actions))]
             return self.actions[0]  # Fallback
             
-        return self.policy[state]
+        return action
 
-    def compute_policy_iteration(self):
+    def tablebase(self):
+        """
+        The policy's moves for 'O' with game-theoretic values, as a
+        ``Tablebase`` (see tablebase.py). Built on first use and again after
+        the policy is recomputed. 3x3 board only.
+        """
+        if not self.shape.standard:
+            raise ValueError("Tablebases are only built for the 3x3 board")
+        if getattr(self, '_tablebase', None) is None:
+            self._tablebase = _planner_tablebase(self)
+        return self._tablebase
+
+    def prepare_for_play(self):
+        # The tablebase takes about 0.1 s to build, a move from it microseconds
+        if self.shape.standard:
+            self.tablebase()
+
+    def compute_policy_iteration(self, method='sweep'):
         """
         Run the policy iteration algorithm to compute optimal policy.
         Returns the number of iterations taken to converge.
+
+        Parameters
+        ----------
+        method : str
+            How each policy is evaluated (default: 'sweep')
+
+            - 'sweep': in-place Python sweeps from a random initial policy
+            - 'exact': direct solve of the policy's linear system
+            - 'vectorized': NumPy sweeps until changes are below ``theta``
+            - 'retrograde': one exact backward pass from full boards to the
+              empty board, improving and evaluating each layer once its
+              successors are final; ``theta`` is not used
+
+            The array backends start from the greedy policy of the current
+            values, carry values over between iterations and store one
+            timing dict per iteration in ``self.timings``.
         """
+        self._tablebase = None
+        if method == 'retrograde':
+            mdp = compiled_mdp(self.symmetry, self.shape)
+            values, cells, timing = mdp.retrograde(self.gamma)
+            self.V.update(zip(mdp.space.keys, values.tolist()))
+            self.policy.update(mdp.policy_dict(cells))
+            self.timings = [timing]
+            return 1
+        if method in ('exact', 'vectorized'):
+            mdp = compiled_mdp(self.symmetry, self.shape)
+            values = np.array([self.V[key] for key in mdp.space.keys])
+            theta = None if method == 'exact' else self.theta
+            values, cells, self.timings = mdp.policy_iteration(
+                self.gamma, mdp.greedy(values, self.gamma), theta, values)
+            self.V.update(zip(mdp.space.keys, values.tolist()))
+            self.policy.update(mdp.policy_dict(cells))
+            return len(self.timings)
+        if method != 'sweep':
+            raise ValueError("Unknown method")
+
         iteration = 0
-        
+        space = solver_states(self.symmetry, self.shape)
+
         # Initialize random policy
-        for state in self.get_all_states():
-            if not self.is_terminal_state(state):
-                valid_actions = self.get_valid_actions(state)
-                if valid_actions:
-                    self.policy[state] = valid_actions[np.random.randint(len(valid_actions))]
-        
+        for sid in space.nonterminal():
+            valid_actions = space.actions[sid]
+            cell = valid_actions[np.random.randint(len(valid_actions))]
+            self.policy[space.keys[sid]] = self.shape.action_of(cell)
+
         while True:
             iteration += 1
-            
+
             # 1. Policy Evaluation
             self.policy_evaluation()
-            
+
             # 2. Policy Improvement
             policy_stable = self.policy_improvement()
-            
+
             # 3. Check if policy has converged
             if policy_stable:
                 break
-                
+
         return iteration
 
     def policy_evaluation(self):
         """
         Evaluate current policy until convergence.
         """
+        space = solver_states(self.symmetry, self.shape)
+        successors = space.successors['X']
+        rewards = landing_rewards(space)
+        values = [self.V[key] for key in space.keys]
+
+        # Resolve each state's policy action to its successor id once
+        chosen = []
+        for sid in space.nonterminal():
+            action = self.policy.get(space.keys[sid])
+            if action is not None:
+                chosen.append((sid, successors[sid][self.shape.cell_of(action)]))
+
         while True:
             delta = 0
-            # Iterate through all states
-            for state in self.get_all_states():
-                if self.is_terminal_state(state):
-                    continue
-                    
-                old_value = self.V[state]
-                
-                # Get action from current policy
-                action = self.policy.get(state)
-                if action is None:
-                    continue
-                
-                # Compute new value based on current policy
-                next_state = self.get_next_state(state, action)
-                reward = self.get_reward(state, action, next_state)
-                self.V[state] = reward + self.gamma * self.V[next_state]
-                
-                # Track maximum change in value
-                delta = max(delta, abs(old_value - self.V[state]))
-            
+            for sid, n in chosen:
+                value = rewards[n] + self.gamma * values[n]
+                delta = max(delta, abs(values[sid] - value))
+                values[sid] = value
+
             # Check if value function has converged
             if delta < self.theta:
                 break
 
+        self.V.update(zip(space.keys, values))
+
     def policy_improvement(self):
         """
         Improve policy for all states and check if policy is stable.
         Returns True if policy is stable (no changes made).
         """
         policy_stable = True
-        
-        for state in self.get_all_states():
-            if self.is_terminal_state(state):
-                continue
-                
+        space = solver_states(self.symmetry, self.shape)
+        successors = space.successors['X']
+        rewards = landing_rewards(space)
+        values = [self.V[key] for key in space.keys]
+
+        for sid in space.nonterminal():
+            state = space.keys[sid]
             old_action = self.policy.get(state)
-            
+
             # Find best action under current values
             best_action = None
             best_value = float('-inf')
-            
-            for action in self.get_valid_actions(state):
-                next_state = self.get_next_state(state, action)
-                value = self.get_reward(state, action, next_state) + \
-                       self.gamma * self.V[next_state]
-                       
+
+            for cell in space.actions[sid]:
+                n = successors[sid][cell]
+                value = rewards[n] + self.gamma * values[n]
                 if value > best_value:
                     best_value = value
-                    best_action = action
-            
-            if best_action is not None:
-                self.policy[state] = best_action
-            
+                    best_action = self.shape.action_of(cell)
+
+            self.policy[state] = best_action
+
             if old_action != best_action:
                 policy_stable = False
-                
+
         return policy_stable
 
     def is_terminal_state(self, state):
         """
         Check if the given state is terminal (game over).
         """
-        # Check for wins
-        for i in range(3):
-            # Check rows
-            if state[i*3:(i+1)*3] in ['XXX', 'OOO']:
-                return True
-            # Check columns
-            if state[i] + state[i+3] + state[i+6] in ['XXX', 'OOO']:
-                return True
-        
-        # Check diagonals
-        if state[0] + state[4] + state[8] in ['XXX', 'OOO']:
-            return True
-        if state[2] + state[4] + state[6] in ['XXX', 'OOO']:
-            return True
-        
-        # Check for draw (no empty spaces)
-        if '-' not in state:
-            return True
-            
-        return False
+        return self.shape.is_terminal(*self.shape.from_key(state))
 
     def get_valid_actions(self, state):
         """
         Get list of valid actions for the given state.
         """
-        return [(i//3, i%3) for i in range(9) if state[i] == '-']
+        return list(self.shape.legal_actions(state))
 
     def get_next_state(self, state, action):
         """
         Get the next state after taking an action.
         Returns the state string after applying the action.
         """
-        pos = action[0] * 3 + action[1]
+        pos = self.shape.cell_of(action)
         return state[:pos] + 'X' + state[pos+1:]
 
     def get_reward(self, state, action, next_state):
@@ -509,36 +1000,22 @@ class PolicyIterationAgent(Learner):
 
     def check_win(self, state, player):
         """Check if the specified player has won."""
-        win_patterns = [
-            [0,1,2], [3,4,5], [6,7,8],  # Rows
-            [0,3,6], [1,4,7], [2,5,8],  # Columns
-            [0,4,8], [2,4,6]            # Diagonals
-        ]
-        
-        for pattern in win_patterns:
-            if all(state[i] == player for i in pattern):
-                return True
-        return False
+        x, o = self.shape.from_key(state)
+        return self.shape.is_win(x if player == 'X' else o)
 
     def get_all_states(self):
         """
-        Generate all possible game states.
-        This is a simplified version - you might want to optimize this.
+        Return every state the solver works on, in state id order.
+        The index is enumerated once per process and shared by both solvers.
         """
-        states = set()
-        states.add('-' * 9)  # Empty board
-        
-        # Generate states (this is a simplified version)
-        # In practice, you'd want to generate only valid game states
-        for i in range(9):
-            new_states = set()
-            for state in states:
-                if state[i] == '-':
-                    new_states.add(state[:i] + 'X' + state[i+1:])
-                    new_states.add(state[:i] + 'O' + state[i+1:])
-            states.update(new_states)
-        
-        return states
+        return solver_states(self.symmetry, self.shape).keys
+
+    def file_contents(self):
+        return _planner_file_contents(self)
+
+    @classmethod
+    def from_file(cls, header, arrays):
+        return _planner_from_file(cls, header, arrays)
 
     def update(self, s, s_, a, a_, r):
         """
@@ -546,4 +1023,224 @@ class PolicyIterationAgent(Learner):
         Policy Iteration is model-based and doesn't use online updates.
         """
         pass
-  
\ No newline at end of file
+  
+
+
+class NegamaxAgent(Learner):
+    """
+    Game-tree search agent for Tic-tac-toe.
+
+    Unlike the Value and Policy Iteration agents, whose model only ever
+    places 'X', this agent searches the real game, where the players take
+    turns, with negamax and alpha-beta pruning. Deeper searches are run one
+    after another (iterative deepening), and moves are tried best first: the
+    move stored for the position, then immediate wins, then the cells on the
+    most lines (center, corners and sides on 3x3). Every searched position is kept in a transposition
+    table that persists across moves, games and saves, so once a position
+    has been solved its move costs one lookup.
+
+    The agent plays 'O', so 'O' is taken to be on move unless 'O' has more
+    marks than 'X'.
+
+    Parameters
+    ----------
+    max_nodes : int
+        Positions searched per move; when the budget runs out the best move
+        of the deepest completed search is played (default: None, no limit)
+    time_limit : float
+        Seconds of search per move, applied the same way (default: None, no limit)
+    shape : bitboard.Shape
+        Board to play on (default: the 3x3 board). Beyond 3x3 a full search is
+        rarely affordable, so set a budget; see boards.py for defaults.
+    """
+
+    def __init__(self, max_nodes=None, time_limit=None, shape=STANDARD):
+        # Note: alpha and eps are not used by a search agent
+        super().__init__(alpha=None, gamma=1., eps=0, eps_decay=0, shape=shape)
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+
+        # Transposition table: (mine, theirs) -> (depth, bound, value, cell),
+        # where mine holds the marks of the side to move
+        self.table = {}
+
+        # Positions visited by the last call to get_action
+        self.nodes = 0
+
+    @metrics.timed('tictactoe_get_action_seconds', 'Latency of get_action', metrics.AGENT_LABEL)
+    def get_action(self, state):
+        """
+        Get the best action for the side to move.
+
+        Parameters
+        ----------
+        state : str
+            Current game state representation
+
+        Returns
+        -------
+        tuple
+            (row, col) action to take
+        """
+        x, o = self.shape.from_key(state)
+        mine, theirs = (x, o) if bin(o).count('1') > bin(x).count('1') else (o, x)
+        return self.shape.action_of(self.best_move(mine, theirs))
+
+    def best_move(self, mine, theirs):
+        """Cell to play for the side to move, which holds ``mine``."""
+        key = (mine, theirs)
+        empties = self.shape.size - bin(mine | theirs).count('1')
+        entry = self.table.get(key)
+        if entry is not None and entry[0] >= empties and entry[1] == _EXACT:
+            self.nodes = 0
+            return entry[3]
+
+        self.nodes = 0
+        self._node_limit = self.max_nodes or float('inf')
+        self._deadline = time.perf_counter() + self.time_limit if self.time_limit else float('inf')
+        move = self._ordered_moves(mine, theirs, key)[0]
+        try:
+            for depth in range(1, empties + 1):
+                self._search(mine, theirs, depth, -_INFINITY, _INFINITY)
+                move = self.table[key][3]
+        except _OutOfBudget:
+            pass
+        return move
+
+    def value(self, mine, theirs):
+        """
+        Game-theoretic value for the side to move: the number of empty cells
+        plus one when it wins (sooner wins score higher), minus that when it
+        loses, 0 for a draw. Searched to the end of the game, ignoring the budget.
+        """
+        empties = self.shape.size - bin(mine | theirs).count('1')
+        self._node_limit = self._deadline = float('inf')
+        return self._search(mine, theirs, empties, -_INFINITY, _INFINITY)
+
+    def _ordered_moves(self, mine, theirs, key):
+        # Stored best move, then winning moves, then the cells on most lines
+        # (center, corners and sides on the 3x3 board)
+        shape = self.shape
+        free = [c for c in shape.move_order if not (mine | theirs) & shape.cells[c]]
+        entry = self.table.get(key)
+        first = [c for c in free if shape.wins_with(mine | shape.cells[c], c)]
+        if entry is not None and entry[3] in free and entry[3] not in first:
+            first.insert(0, entry[3])
+        return first + [c for c in free if c not in first]
+
+    def _search(self, mine, theirs, depth, alpha, beta):
+        # Negamax value for the side to move, looking depth moves ahead;
+        # positions beyond the horizon score as a draw
+        self.nodes += 1
+        if self.nodes > self._node_limit or \
+                (not self.nodes & 255 and time.perf_counter() > self._deadline):
+            raise _OutOfBudget()
+        empties = self.shape.size - bin(mine | theirs).count('1')
+        if self.shape.is_win(theirs):
+            return -(empties + 1)
+        if not empties or not depth:
+            return 0
+
+        key = (mine, theirs)
+        entry = self.table.get(key)
+        if entry is not None and entry[0] >= depth:
+            bound, value = entry[1], entry[2]
+            if bound == _EXACT:
+                return value
+            if bound == _LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        alpha_start = alpha
+        best, best_cell = -_INFINITY, None
+        for cell in self._ordered_moves(mine, theirs, key):
+            value = -self._search(theirs, mine | self.shape.cells[cell], depth - 1, -beta, -alpha)
+            if value > best:
+                best, best_cell = value, cell
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        bound = _UPPER if best <= alpha_start else _LOWER if best >= beta else _EXACT
+        self.table[key] = (depth, bound, best, best_cell)
+        return best
+
+    def file_contents(self):
+        # The transposition table as three arrays
+        if self.shape.size > 64:
+            raise ValueError(f"Cannot save the search table of the {self.shape.name} board")
+        mine = np.array([k[0] for k in self.table], dtype=np.uint64)
+        theirs = np.array([k[1] for k in self.table], dtype=np.uint64)
+        entries = np.array(list(self.table.values()), dtype=np.int16).reshape(-1, 4)
+        params = {'max_nodes': self.max_nodes, 'time_limit': self.time_limit,
+                  'shape': self.shape.name}
+        return params, None, {'mine': mine, 'theirs': theirs, 'entries': entries}
+
+    @classmethod
+    def from_file(cls, header, arrays):
+        params = dict(header['params'])
+        params['shape'] = parse_shape(params.get('shape', STANDARD.name))
+        agent = cls(**params)
+        if 'keys' in arrays:
+            # Files written before boards other than 3x3: keys are mine | theirs << 9
+            keys = arrays['keys'].astype(np.int64)
+            mine, theirs = keys & bitboard.FULL, keys >> 9
+        else:
+            mine, theirs = arrays['mine'], arrays['theirs']
+        agent.table = dict(zip(zip(mine.tolist(), theirs.tolist()),
+                               map(tuple, arrays['entries'].tolist())))
+        return agent
+
+    def update(self, s, s_, a, a_, r):
+        """
+        Required by parent class but not used by the search agent.
+        """
+        pass
+
+
+def _planner_policy_action(agent, state):
+    # The computed policy's action for state, None if it has none
+    if agent.symmetry:
+        key, transform, _ = symmetry.canonical(state)
+        if key in agent.policy:
+            return symmetry.from_canonical(agent.policy[key], transform)
+    return agent.policy.get(state)
+
+
+def _planner_tablebase(agent):
+    def move(mine, theirs):
+        action = _planner_policy_action(agent, bitboard.to_key(theirs, mine))
+        return None if action is None else bitboard.cell_of(action)
+    return Tablebase.from_moves(move)
+
+
+def _planner_file_contents(agent):
+    # V and the policy as arrays over the solver's state index
+    space = solver_states(agent.symmetry, agent.shape)
+    values = np.array([agent.V[key] for key in space.keys], dtype=np.float64)
+    cells = np.array([agent.shape.cell_of(agent.policy[key]) if key in agent.policy else -1
+                      for key in space.keys], dtype=np.int8)
+    params = {'gamma': agent.gamma, 'theta': agent.theta, 'symmetry': agent.symmetry,
+              'shape': agent.shape.name}
+    index = agentfile.index_header(space, 'solver', agent.symmetry)
+    return params, index, {'values': values, 'policy': cells}
+
+
+def _planner_from_file(cls, header, arrays):
+    params = dict(header['params'])
+    params['shape'] = parse_shape(params.get('shape', STANDARD.name))
+    agent = cls(**params)
+    space = solver_states(agent.symmetry, agent.shape)
+    agentfile.check_index(header['index'], space)
+    agent.V = agentfile.StateValues(space, arrays['values'])
+    agent.policy = agentfile.StatePolicy(space, arrays['policy'])
+    return agent
+
+
+# Agent classes by the name stored in agent files
+AGENTS = {cls.__name__: cls for cls in
+          (Qlearner, SARSAlearner, QLambdaLearner, SARSALambdaLearner, ApproxQlearner,
+           ValueIterationAgent, PolicyIterationAgent, NegamaxAgent)}
@@ -0,0 +1,217 @@
+"""
+Binary agent files.
+
+A file is an 8-byte magic, a little-endian uint32 format version, a uint32
+header length, a JSON header and then raw arrays, each starting on a 64-byte
+boundary. The header names the agent class and its hyperparameters, records
+the state index the arrays are laid out on and a CRC-32 of the array bytes,
+and lists every array with its dtype, shape and offset. Loading maps the file
+once and hands out array views into it, so no per-state Python objects are
+built.
+
+Files are written to a temporary file in the target directory and renamed
+over the target, so readers see either the old file or the new one.
+"""
+import collections.abc
+import contextlib
+import functools
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+
+MAGIC = b'TTTAGENT'
+VERSION = 1
+# Bumped whenever the order of the state indexes in states.py changes
+INDEX_VERSION = 1
+ALIGN = 64
+
+_PREAMBLE = struct.Struct('<8sII')
+
+
+@functools.lru_cache(maxsize=None)
+def _index_crc(space):
+    return zlib.crc32(np.asarray(space.codes, dtype=np.int64).tobytes())
+
+
+def index_header(space, name, canonical=False):
+    """Header entry identifying the state index ``space`` (built by ``name``)."""
+    return {'space': name, 'canonical': canonical, 'version': INDEX_VERSION,
+            'states': len(space), 'crc': _index_crc(space)}
+
+
+def check_index(header, space):
+    """Raise if ``header`` was written for a different layout of ``space``."""
+    if (header['version'], header['states'], header['crc']) != \
+            (INDEX_VERSION, len(space), _index_crc(space)):
+        raise ValueError("Agent file was saved with a different state index")
+
+
+def _file_mode(path):
+    # Mode of the file being replaced, else the default for new files
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    """Binary file object whose contents replace ``path`` only once complete."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp makes the file owner-only; keep the mode open() would give
+        os.chmod(tmp, _file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def is_agent_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write(path, header, arrays):
+    """
+    Atomically write ``arrays`` (a dict of name -> ndarray) with ``header``.
+
+    The array table and the checksum are added to a copy of ``header``.
+    """
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    table, offset, crc = {}, 0, 0
+    for name, a in arrays.items():
+        table[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+        crc = zlib.crc32(a.data, crc)
+    header = dict(header, arrays=table, checksum=crc)
+
+    text = json.dumps(header, sort_keys=True).encode()
+    start = -(-(_PREAMBLE.size + len(text)) // ALIGN) * ALIGN
+    text = text.ljust(start - _PREAMBLE.size)
+    with atomic_write(path) as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(text)))
+        f.write(text)
+        for name, a in arrays.items():
+            f.write(a.data)
+            f.write(b'\0' * (-a.nbytes % ALIGN))
+
+
+def read(path, mmap_mode='r', verify=False):
+    """
+    Read an agent file.
+
+    Parameters
+    ----------
+    path : str
+        File written by ``write``
+    mmap_mode : str or None
+        'r' maps the arrays read-only, 'c' maps them copy-on-write (writes
+        stay in memory), None reads them into memory (default: 'r')
+    verify : bool
+        Check the array checksum; this touches every page of the file
+        (default: False)
+
+    Returns
+    -------
+    tuple
+        (header, arrays)
+    """
+    if mmap_mode is None:
+        data = np.fromfile(path, dtype=np.uint8)
+    else:
+        data = np.memmap(path, dtype=np.uint8, mode=mmap_mode)
+    if data.size < _PREAMBLE.size:
+        raise ValueError("Not an agent file")
+    magic, version, length = _PREAMBLE.unpack(data[:_PREAMBLE.size].tobytes())
+    if magic != MAGIC:
+        raise ValueError("Not an agent file")
+    if version != VERSION:
+        raise ValueError("Unknown agent file version")
+    header = json.loads(data[_PREAMBLE.size:_PREAMBLE.size + length].tobytes())
+
+    start = _PREAMBLE.size + length
+    arrays, crc = {}, 0
+    for name, spec in sorted(header['arrays'].items(), key=lambda item: item[1]['offset']):
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        offset = start + spec['offset']
+        raw = data[offset:offset + count * dtype.itemsize]
+        if verify:
+            crc = zlib.crc32(raw, crc)
+        arrays[name] = raw.view(dtype).reshape(spec['shape'])
+    if verify and crc != header['checksum']:
+        raise ValueError("Agent file is corrupt")
+    return header, arrays
+
+
+class StateValues(collections.abc.MutableMapping):
+    """
+    ``V`` of a loaded planning agent: one float per state of ``space``, read
+    like the ``defaultdict(float)`` it replaces.
+    """
+
+    def __init__(self, space, values):
+        self.space = space
+        self.array = values
+
+    def __getitem__(self, key):
+        sid = self.space.index.get(key)
+        return 0. if sid is None else float(self.array[sid])
+
+    def __setitem__(self, key, value):
+        self.array[self.space.index[key]] = value
+
+    def __delitem__(self, key):
+        raise TypeError("States cannot be removed from a value table")
+
+    def __contains__(self, key):
+        return key in self.space.index
+
+    def __iter__(self):
+        return iter(self.space.keys)
+
+    def __len__(self):
+        return len(self.space)
+
+
+class StatePolicy(collections.abc.MutableMapping):
+    """
+    ``policy`` of a loaded planning agent: one cell per state of ``space``,
+    -1 where the policy has no action.
+    """
+
+    def __init__(self, space, cells):
+        self.space = space
+        self.array = cells
+
+    def __getitem__(self, key):
+        sid = self.space.index.get(key)
+        if sid is None or self.array[sid] < 0:
+            raise KeyError(key)
+        return self.space.shape.action_of(int(self.array[sid]))
+
+    def __setitem__(self, key, action):
+        self.array[self.space.index[key]] = self.space.shape.cell_of(action)
+
+    def __delitem__(self, key):
+        self.array[self.space.index[key]] = -1
+
+    def __iter__(self):
+        return (self.space.keys[sid] for sid in np.flatnonzero(self.array >= 0).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(self.array >= 0))
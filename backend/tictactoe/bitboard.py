@@ -0,0 +1,258 @@
+"""
+Bitboard representation shared by the game, the teacher and the agents.
+
+A position is two 9-bit masks, one for 'X' and one for 'O'. Bit ``3*row + col``
+is set when that player occupies the cell. Win, draw and legal-move tests are
+table lookups indexed by a mask.
+"""
+import functools
+
+
+FULL = 0b111111111
+CELLS = tuple(1 << cell for cell in range(9))
+
+# Cell triples that make three in a row
+WIN_LINES = (
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),  # Rows
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),  # Columns
+    (0, 4, 8), (2, 4, 6)              # Diagonals
+)
+WIN_MASKS = tuple(sum(CELLS[c] for c in line) for line in WIN_LINES)
+
+# WINNING[mask] is True if the cells in mask contain three in a row
+WINNING = tuple(any(mask & w == w for w in WIN_MASKS) for mask in range(512))
+
+# EMPTY_CELLS[x | o] lists the free cells in ascending order
+EMPTY_CELLS = tuple(tuple(c for c in range(9) if not mask & CELLS[c])
+                    for mask in range(512))
+
+# Three-character strings for one row, indexed by (x_row | o_row << 3)
+_ROW_KEYS = tuple(''.join('X' if r & (1 << c) else 'O' if r & (8 << c) else '-'
+                          for c in range(3))
+                  for r in range(64))
+
+
+def cell_of(action):
+    """(row, col) -> cell index."""
+    return action[0]*3 + action[1]
+
+
+def action_of(cell):
+    """Cell index -> (row, col)."""
+    return cell // 3, cell % 3
+
+
+def is_win(mask):
+    return WINNING[mask]
+
+
+def is_full(x, o):
+    return x | o == FULL
+
+
+def is_terminal(x, o):
+    return WINNING[x] or WINNING[o] or x | o == FULL
+
+
+def winner(x, o):
+    """Return 'X' or 'O' if that player has three in a row, else None."""
+    if WINNING[x]:
+        return 'X'
+    if WINNING[o]:
+        return 'O'
+    return None
+
+
+def state_id(x, o):
+    """Integer state key: X cells in the low 9 bits, O cells in the next 9."""
+    return x | o << 9
+
+
+def from_state_id(sid):
+    return sid & FULL, sid >> 9
+
+
+def to_key(x, o):
+    """The 9-character 'X'/'O'/'-' key used by existing agent tables."""
+    return (_ROW_KEYS[(x & 7) | (o & 7) << 3]
+            + _ROW_KEYS[(x >> 3 & 7) | (o >> 3 & 7) << 3]
+            + _ROW_KEYS[(x >> 6) | (o >> 6) << 3])
+
+
+@functools.lru_cache(maxsize=None)
+def from_key(key):
+    """Masks (x, o) for a 9-character key."""
+    x = o = 0
+    for cell, elt in enumerate(key):
+        if elt == 'X':
+            x |= CELLS[cell]
+        elif elt == 'O':
+            o |= CELLS[cell]
+    return x, o
+
+
+@functools.lru_cache(maxsize=None)
+def legal_actions(key):
+    """Free cells of a 9-character key as (row, col) tuples."""
+    x, o = from_key(key)
+    return tuple(action_of(c) for c in EMPTY_CELLS[x | o])
+
+
+def to_board(x, o):
+    """Masks -> list-of-lists board as printed by ``printBoard``."""
+    key = to_key(x, o)
+    return [list(key[0:3]), list(key[3:6]), list(key[6:9])]
+
+
+def from_board(board):
+    """List-of-lists board -> masks (x, o)."""
+    return from_key(''.join(elt for row in board for elt in row))
+
+
+class Shape:
+    """
+    Geometry of an m,n,k board: ``rows`` x ``cols`` cells, won by ``k`` marks
+    in a row horizontally, vertically or diagonally.
+
+    Cells are numbered ``cols*row + col`` and masks use the same bits as on
+    the 3x3 board, with 'O' shifted by ``size`` in state ids. Lines are kept
+    as masks, with the lines through each cell listed so a move can be tested
+    against only the lines it touches. Boards of up to 16 cells also get a
+    mask -> win table. The 3x3 board (``STANDARD``) answers through the
+    module-level functions above.
+    """
+
+    def __init__(self, rows, cols, k):
+        if rows < 1 or cols < 1 or not 1 <= k <= max(rows, cols):
+            raise ValueError(f"Invalid board: {rows}x{cols} with {k} in a row")
+        self.rows, self.cols, self.k = rows, cols, k
+        self.name = f'{rows}x{cols}-k{k}'
+        self.standard = (rows, cols, k) == (3, 3, 3)
+        self.size = rows * cols
+        self.full = (1 << self.size) - 1
+        self.cells = tuple(1 << cell for cell in range(self.size))
+
+        lines = []
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for r in range(rows):
+                for c in range(cols):
+                    end_r, end_c = r + dr*(k - 1), c + dc*(k - 1)
+                    if 0 <= end_r < rows and 0 <= end_c < cols:
+                        lines.append(sum(self.cells[(r + dr*i)*cols + c + dc*i] for i in range(k)))
+        self.win_masks = tuple(lines)
+        self.lines_through = tuple(tuple(w for w in self.win_masks if w & self.cells[cell])
+                                   for cell in range(self.size))
+        self.winning = None
+        if self.size <= 16:
+            self.winning = tuple(any(mask & w == w for w in self.win_masks)
+                                 for mask in range(1 << self.size))
+
+        # Cells on the most lines first, then from the center outwards: a good
+        # order to try moves in (center, corners, sides on the 3x3 board)
+        self.move_order = tuple(sorted(range(self.size), key=lambda cell: (
+            -len(self.lines_through[cell]),
+            (2*(cell // cols) - rows + 1)**2 + (2*(cell % cols) - cols + 1)**2, cell)))
+
+    def __repr__(self):
+        return f'Shape({self.rows}, {self.cols}, {self.k})'
+
+    def __eq__(self, other):
+        return isinstance(other, Shape) and \
+            (self.rows, self.cols, self.k) == (other.rows, other.cols, other.k)
+
+    def __hash__(self):
+        return hash((self.rows, self.cols, self.k))
+
+    def __reduce__(self):
+        return parse_shape, (self.name,)
+
+    def is_win(self, mask):
+        if self.winning is not None:
+            return self.winning[mask]
+        return any(mask & w == w for w in self.win_masks)
+
+    def wins_with(self, mask, cell):
+        """True if ``mask``, which holds ``cell``, has a line through it."""
+        return any(mask & w == w for w in self.lines_through[cell])
+
+    def is_full(self, x, o):
+        return x | o == self.full
+
+    def is_terminal(self, x, o):
+        return self.is_win(x) or self.is_win(o) or x | o == self.full
+
+    def winner(self, x, o):
+        if self.is_win(x):
+            return 'X'
+        if self.is_win(o):
+            return 'O'
+        return None
+
+    def empty_cells(self, mask):
+        """Free cells of ``x | o`` in ascending order."""
+        if self.standard:
+            return EMPTY_CELLS[mask]
+        free = self.full & ~mask
+        cells = []
+        while free:
+            low = free & -free
+            cells.append(low.bit_length() - 1)
+            free ^= low
+        return tuple(cells)
+
+    def action_of(self, cell):
+        return divmod(cell, self.cols)
+
+    def cell_of(self, action):
+        return action[0]*self.cols + action[1]
+
+    def state_id(self, x, o):
+        return x | o << self.size
+
+    def from_state_id(self, sid):
+        return sid & self.full, sid >> self.size
+
+    def to_key(self, x, o):
+        if self.standard:
+            return to_key(x, o)
+        return ''.join('X' if x >> c & 1 else 'O' if o >> c & 1 else '-'
+                       for c in range(self.size))
+
+    def from_key(self, key):
+        if self.standard:
+            return from_key(key)
+        return _masks_of_key(key)
+
+    def legal_actions(self, key):
+        if self.standard:
+            return legal_actions(key)
+        return tuple(divmod(cell, self.cols) for cell, elt in enumerate(key) if elt == '-')
+
+    def to_board(self, x, o):
+        key = self.to_key(x, o)
+        return [list(key[r*self.cols:(r + 1)*self.cols]) for r in range(self.rows)]
+
+
+@functools.lru_cache(maxsize=4096)
+def _masks_of_key(key):
+    x = o = 0
+    for cell, elt in enumerate(key):
+        if elt == 'X':
+            x |= 1 << cell
+        elif elt == 'O':
+            o |= 1 << cell
+    return x, o
+
+
+@functools.lru_cache(maxsize=None)
+def parse_shape(name):
+    """The ``Shape`` of a name such as '4x4-k3' (rows x columns, k in a row)."""
+    try:
+        size, k = name.split('-k')
+        rows, cols = size.split('x')
+        return Shape(int(rows), int(cols), int(k))
+    except ValueError:
+        raise ValueError(f"Unknown board: {name}") from None
+
+
+STANDARD = parse_shape('3x3-k3')
@@ -0,0 +1,43 @@
+"""
+Training and search defaults for the supported m,n,k boards.
+
+Larger boards have more states per game, so the learners get more
+exploration to cover them and a longer horizon to value wins that are many
+moves away; the function-approximation agent keeps its own gradient step
+size. Value and Policy Iteration enumerate every position, so they are only
+offered on boards small enough to enumerate (see ``states.MAX_STATES``).
+The search agent gets a per-move budget on boards it cannot solve outright.
+"""
+from .bitboard import parse_shape
+
+BOARD_CONFIGS = {
+    '3x3-k3': {'alpha': 0.5, 'gamma': 0.9, 'epsilon': 0.1,
+               'agents': ('q', 's', 'f', 'v', 'p', 'n'), 'max_nodes': None, 'time_limit': None},
+    '3x4-k3': {'alpha': 0.5, 'gamma': 0.9, 'epsilon': 0.1,
+               'agents': ('q', 's', 'f', 'v', 'p', 'n'), 'max_nodes': None, 'time_limit': None},
+    '4x4-k3': {'alpha': 0.5, 'gamma': 0.95, 'epsilon': 0.2,
+               'agents': ('q', 's', 'f', 'n'), 'max_nodes': 200000, 'time_limit': 2.},
+    '5x5-k4': {'alpha': 0.5, 'gamma': 0.95, 'epsilon': 0.2,
+               'agents': ('q', 's', 'f', 'n'), 'max_nodes': 100000, 'time_limit': 2.},
+    '7x6-k4': {'alpha': 0.5, 'gamma': 0.97, 'epsilon': 0.2,
+               'agents': ('q', 's', 'f', 'n'), 'max_nodes': 50000, 'time_limit': 2.},
+}
+
+
+def board_config(name):
+    """
+    Shape and defaults of a supported board.
+
+    Parameters
+    ----------
+    name : str
+        Board name, e.g. '4x4-k3' (rows x columns, k in a row)
+
+    Returns
+    -------
+    tuple
+        (bitboard.Shape, dict of defaults from ``BOARD_CONFIGS``)
+    """
+    if name not in BOARD_CONFIGS:
+        raise ValueError(f"Unsupported board: {name} (choose from {', '.join(BOARD_CONFIGS)})")
+    return parse_shape(name), BOARD_CONFIGS[name]
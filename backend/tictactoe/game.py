@@ -1,64 +1,81 @@
 import random
 
+from . import metrics
+from .bitboard import STANDARD
+from .zobrist import key_cache
+
 
 class Game:
     """ The game class. New instance created for each new game. """
-    def __init__(self, agent, player=None, player_type=None):
+    def __init__(self, agent, player=None, player_type=None, shape=STANDARD):
         self.agent = agent
         self.player = player
         self.player_type = player_type
-        self.board = [['-', '-', '-'], ['-', '-', '-'], ['-', '-', '-']]
+        # Board geometry (bitboard.Shape)
+        self.shape = shape
+        # Bitboards of the cells held by 'X' and 'O'
+        self.x = 0
+        self.o = 0
+        # Zobrist hash of the position, updated by every move (see zobrist.py)
+        self.hash = 0
+        self.keys = key_cache(shape)
+
+    @property
+    def board(self):
+        """ List-of-lists view of the position, for printing and callers that read cells. """
+        return self.shape.to_board(self.x, self.o)
+
+    def stateKey(self):
+        return self.keys.key(self.hash, self.x, self.o)
+
+    def stateId(self):
+        return self.shape.state_id(self.x, self.o)
+
+    def move(self, action, key):
+        cell = self.shape.cell_of(action)
+        if key == 'X':
+            self.x |= self.shape.cells[cell]
+            self.hash ^= self.keys.zobrist.x_codes[cell]
+        else:
+            self.o |= self.shape.cells[cell]
+            self.hash ^= self.keys.zobrist.o_codes[cell]
 
     def playerMove(self):
         
         if self.player is None:
             printBoard(self.board)
             while True:
-                move = input("Your move! Please select a row and column from 0-2 "
-                             "in the format row,col: ")
+                move = input("Your move! Please select a row from 0-%i and a column from 0-%i "
+                             "in the format row,col: " % (self.shape.rows - 1, self.shape.cols - 1))
                 print('\n')
                 try:
                     row, col = int(move[0]), int(move[2])
                 except ValueError:
                     print("INVALID INPUT! Please use the correct format.")
                     continue
-                if row not in range(3) or col not in range(3) or not self.board[row][col] == '-':
+                if row not in range(self.shape.rows) or col not in range(self.shape.cols) or \
+                        (self.x | self.o) & self.shape.cells[self.shape.cell_of((row, col))]:
                     print("INVALID MOVE! Choose again.")
                     continue
-                self.board[row][col] = 'X'
+                self.move((row, col), 'X')
                 break
 
         elif self.player_type == "teacher":
-            action = self.player.makeMove(self.board)
-            self.board[action[0]][action[1]] = 'X'
+            action = self.player.makeMove(self.x, self.o)
+            self.move(action, 'X')
         else: # self.player_type == "agent"
-            state = getStateKey(self.board)
-            action = self.player.get_action(state)
-            self.board[action[0]][action[1]] = 'X'
+            action = self.player.get_action(self.stateKey())
+            self.move(action, 'X')
 
 
     def agentMove(self, action):
-        self.board[action[0]][action[1]] = 'O'
+        self.move(action, 'O')
 
     def checkForWin(self, key):
-        a = [self.board[0][0], self.board[1][1], self.board[2][2]]
-        b = [self.board[0][2], self.board[1][1], self.board[2][0]]
-        if a.count(key) == 3 or b.count(key) == 3:
-            return True
-        for i in range(3):
-            col = [self.board[0][i], self.board[1][i], self.board[2][i]]
-            row = [self.board[i][0], self.board[i][1], self.board[i][2]]
-            if col.count(key) == 3 or row.count(key) == 3:
-                return True
-        return False
+        return self.shape.is_win(self.x if key == 'X' else self.o)
 
     def checkForDraw(self):
-        draw = True
-        for row in self.board:
-            for elt in row:
-                if elt == '-':
-                    draw = False
-        return draw
+        return self.shape.is_full(self.x, self.o)
 
     def checkForEnd(self, key):
         if self.checkForWin(key):
@@ -76,10 +93,12 @@ class Game:
             return 0
         return -1
 
+    @metrics.timed('tictactoe_game_seconds', 'Time to play one game',
+                   ('opponent', lambda game: game.player_type or 'human'))
     def playGame(self, player_first):
         if player_first:
             self.playerMove()
-        prev_state = getStateKey(self.board)
+        prev_state = self.stateKey()
         prev_action = self.agent.get_action(prev_state)
 
         while True:
@@ -95,7 +114,7 @@ class Game:
                 break
             else:
                 reward = 0
-            new_state = getStateKey(self.board)
+            new_state = self.stateKey()
             new_action = self.agent.get_action(new_state)
             self.agent.update(prev_state, new_state, prev_action, new_action, reward)
             prev_state = new_state
@@ -123,7 +142,7 @@ class Game:
                     print("Invalid input. Please enter 'y' or 'n'.")
 
 def printBoard(board):
-    print('    0   1   2\n')
+    print('    ' + ''.join('%-4i' % j for j in range(len(board[0]))).rstrip() + '\n')
     for i, row in enumerate(board):
         print('%i   ' % i, end='')
         for elt in row:
@@ -131,8 +150,4 @@ def printBoard(board):
         print('\n')
 
 def getStateKey(board):
-    key = ''
-    for row in board:
-        for elt in row:
-            key += elt
-    return key
\ No newline at end of file
+    return ''.join(''.join(row) for row in board)
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Per-episode reward history for the learners.
+
+Each finished episode is one int8 outcome: its final reward, 1 for a win,
+0 for a draw and -1 for a loss. Outcomes are kept in fixed-size chunks, and
+only the newest ``capacity`` episodes are retained. Running totals and a
+moving average are updated incrementally and always cover every episode.
+
+The cumulative reward curve is also kept at a bounded resolution, as the
+lowest and highest value in each of at most ``SERIES_BUCKETS`` buckets of
+episodes. Buckets double in size as training goes on, and only episodes
+recorded since the last fold are processed, see ``series``.
+
+The history is not pickled with the agent. It is saved next to the agent
+file, see ``history_path``.
+"""
+import os
+
+import numpy as np
+
+from .agentfile import atomic_write
+
+def history_path(agent_path):
+    """Where the history of the agent saved at ``agent_path`` lives."""
+    return os.path.splitext(agent_path)[0] + '.rewards.npz'
+
+
+class RewardHistory:
+    """
+    Parameters
+    ----------
+    capacity : int
+        Number of most recent episodes kept individually (default: 10,000,000)
+    window : int
+        Length of the exponential moving average of outcomes (default: 1000)
+    """
+
+    CHUNK = 1 << 16
+    SERIES_BUCKETS = 512
+
+    def __init__(self, capacity=10_000_000, window=1000):
+        self.capacity = capacity
+        self.window = window
+        self.chunks = []
+        self.fill = self.CHUNK
+        self.episodes = 0
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.total_reward = 0.
+        # Reward of episodes that fell out of the retained window
+        self.dropped_reward = 0.
+        self.moving_average = 0.
+        # Buckets of series_bucket episodes from episode series_start on, and
+        # the cumulative reward before series_start
+        self.series_bucket = 1
+        self.series_start = 0
+        self.series_base = 0.
+        self.series_lo = np.zeros(0)
+        self.series_hi = np.zeros(0)
+        self.series_end = np.zeros(0)
+
+    def __len__(self):
+        # Episodes retained individually
+        if not self.chunks:
+            return 0
+        return (len(self.chunks) - 1) * self.CHUNK + self.fill
+
+    def record(self, reward):
+        self.record_many([reward])
+
+    def record_many(self, rewards):
+        """Append the outcomes of several finished episodes, oldest first."""
+        rewards = np.asarray(rewards, dtype=np.int8)
+        n = len(rewards)
+        if not n:
+            return
+        self.episodes += n
+        self.wins += int(np.count_nonzero(rewards > 0))
+        self.losses += int(np.count_nonzero(rewards < 0))
+        self.draws += int(np.count_nonzero(rewards == 0))
+        self.total_reward += float(rewards.sum(dtype=np.int64))
+
+        # Exponential moving average over the batch in one step
+        alpha = 1. / self.window
+        weights = alpha * (1. - alpha) ** np.arange(n - 1, -1, -1)
+        self.moving_average = (1. - alpha) ** n * self.moving_average + float(weights @ rewards)
+
+        start = 0
+        while start < n:
+            if self.fill == self.CHUNK:
+                self.chunks.append(np.zeros(self.CHUNK, dtype=np.int8))
+                self.fill = 0
+            take = min(self.CHUNK - self.fill, n - start)
+            self.chunks[-1][self.fill:self.fill + take] = rewards[start:start + take]
+            self.fill += take
+            start += take
+
+        # Drop the oldest chunks while at least capacity episodes remain
+        while len(self) - self.CHUNK >= self.capacity:
+            self._fold_series()
+            self.dropped_reward += float(self.chunks.pop(0).sum(dtype=np.int64))
+
+    def outcomes(self):
+        """Retained outcomes, oldest first."""
+        if not self.chunks:
+            return np.zeros(0, dtype=np.int8)
+        return np.concatenate(self.chunks[:-1] + [self.chunks[-1][:self.fill]])
+
+    def recent(self, n):
+        """Outcomes of the last ``n`` retained episodes, oldest first."""
+        parts, size = [], 0
+        for i in range(len(self.chunks) - 1, -1, -1):
+            if size >= n:
+                break
+            chunk = self.chunks[i][:self.fill] if i == len(self.chunks) - 1 else self.chunks[i]
+            parts.append(chunk)
+            size += len(chunk)
+        if not parts:
+            return np.zeros(0, dtype=np.int8)
+        return np.concatenate(parts[::-1])[-n:]
+
+    def cumulative(self):
+        """Cumulative reward after each retained episode."""
+        return self.dropped_reward + np.cumsum(self.outcomes(), dtype=np.float64)
+
+    def _fold_series(self):
+        # Fold the complete buckets of episodes recorded since the last fold
+        lo, hi, end = self.series_lo, self.series_hi, self.series_end
+        folded = self.series_start + len(end) * self.series_bucket
+        while len(end) + (self.episodes - folded) // self.series_bucket > self.SERIES_BUCKETS:
+            # Merge pairs of buckets; an unpaired last bucket is folded again later
+            if len(end) % 2:
+                lo, hi, end = lo[:-1], hi[:-1], end[:-1]
+                folded -= self.series_bucket
+            lo = np.minimum(lo[0::2], lo[1::2])
+            hi = np.maximum(hi[0::2], hi[1::2])
+            end = end[1::2]
+            self.series_bucket *= 2
+        n = (self.episodes - folded) // self.series_bucket
+        if n:
+            base = end[-1] if len(end) else self.series_base
+            new = self.recent(self.episodes - folded)[:n * self.series_bucket]
+            c = (base + np.cumsum(new, dtype=np.float64)).reshape(n, self.series_bucket)
+            lo = np.concatenate([lo, c.min(axis=1)])
+            hi = np.concatenate([hi, c.max(axis=1)])
+            end = np.concatenate([end, c[:, -1]])
+        self.series_lo, self.series_hi, self.series_end = lo, hi, end
+
+    def series(self):
+        """
+        Cumulative reward curve downsampled to at most ``2*SERIES_BUCKETS + 4`` points.
+
+        Every bucket contributes its lowest and highest value at its midpoint,
+        in the order the curve moves through them.
+
+        Returns
+        -------
+        tuple
+            (episodes, cumulative rewards) as float arrays
+        """
+        self._fold_series()
+        lo, hi, end = self.series_lo, self.series_hi, self.series_end
+        bucket = self.series_bucket
+        folded = self.series_start + len(end) * bucket
+        x = self.series_start + bucket * (np.arange(len(end)) + 0.5)
+        # The episodes after the last complete bucket form one partial bucket
+        if self.episodes > folded:
+            c = (end[-1] if len(end) else self.series_base) + \
+                np.cumsum(self.recent(self.episodes - folded), dtype=np.float64)
+            lo = np.append(lo, c.min())
+            hi = np.append(hi, c.max())
+            end = np.append(end, c[-1])
+            x = np.append(x, folded + len(c) / 2)
+        if not len(end):
+            return np.array([float(self.series_start)]), np.array([self.series_base])
+        start = np.r_[self.series_base, end[:-1]]
+        rising = end >= start
+        y = np.column_stack([np.where(rising, lo, hi), np.where(rising, hi, lo)]).ravel()
+        x = np.r_[self.series_start, np.repeat(x, 2), self.episodes]
+        y = np.r_[self.series_base, y, end[-1]]
+        return x, y
+
+    def summary(self):
+        return {
+            'episodes': self.episodes,
+            'wins': self.wins,
+            'draws': self.draws,
+            'losses': self.losses,
+            'total_reward': self.total_reward,
+            'moving_average': self.moving_average,
+        }
+
+    def save(self, path):
+        self._fold_series()
+        with atomic_write(path) as f:
+            np.savez(f, outcomes=self.outcomes(),
+                     stats=np.array([self.capacity, self.window, self.episodes, self.wins,
+                                     self.draws, self.losses], dtype=np.int64),
+                     totals=np.array([self.total_reward, self.dropped_reward, self.moving_average]),
+                     series=np.array([self.series_bucket, self.series_start], dtype=np.int64),
+                     series_base=self.series_base, series_lo=self.series_lo,
+                     series_hi=self.series_hi, series_end=self.series_end)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            capacity, window, episodes, wins, draws, losses = data['stats'].tolist()
+            history = cls(capacity, window)
+            history.record_many(data['outcomes'])
+            history.episodes, history.wins, history.draws, history.losses = \
+                episodes, wins, draws, losses
+            history.total_reward, history.dropped_reward, history.moving_average = \
+                data['totals'].tolist()
+            if 'series' in data.files:
+                history.series_bucket, history.series_start = data['series'].tolist()
+                history.series_base = float(data['series_base'])
+                history.series_lo = data['series_lo']
+                history.series_hi = data['series_hi']
+                history.series_end = data['series_end']
+            else:
+                # Saved before the series existed; it starts at the retained episodes
+                history.series_start = episodes - len(history)
+                history.series_base = history.dropped_reward
+        return history
+
+    @classmethod
+    def from_legacy(cls, rewards):
+        """
+        Import the per-step ``rewards`` list of older agents. Steps that are
+        not the end of an episode always had reward 0, so only the non-zero
+        entries are kept; draws cannot be told apart from those and are lost.
+        """
+        history = cls()
+        rewards = np.asarray(rewards, dtype=np.float64)
+        history.record_many(rewards[rewards != 0])
+        return history
@@ -0,0 +1,218 @@
+"""
+Background training jobs for the web app.
+
+Jobs run in a pool of worker processes, so a long training run never blocks
+the server. Each job trains a private copy of its agent, reports progress
+through a queue at most once per ``progress_interval`` seconds and checks for
+cancellation between chunks of episodes. Only a job that finishes saves its
+agent, and ``Learner.save`` replaces the file atomically, so readers see the
+old agent until the new one is complete.
+
+The server collects job events with ``TrainingJobs.poll``, which never blocks.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from .agent import (ApproxQlearner, Learner, NegamaxAgent, PolicyIterationAgent, Qlearner,
+                    SARSAlearner, ValueIterationAgent)
+from .game import Game
+from .teacher import Teacher
+
+# Episodes played between progress and cancellation checks
+CHUNK = 100
+# Episodes the rolling win rate is taken over
+WIN_RATE_WINDOW = 1000
+# Agent types a job can build, and those of them that learn from episodes
+AGENT_TYPES = ('q', 's', 'f', 'v', 'p', 'n')
+LEARNING_TYPES = ('q', 's', 'f')
+
+
+def _make_agent(spec):
+    # Same defaults as play.py
+    agent_type, path = spec['agent_type'], spec['path']
+    if spec.get('load_existing') and os.path.isfile(path):
+        agent = Learner.load(path, mmap_mode='c')
+        agent.resume_training()
+        return agent
+    if agent_type == 'q':
+        return Qlearner(0.5, 0.9, 0.1)
+    if agent_type == 's':
+        return SARSAlearner(0.5, 0.9, 0.1)
+    if agent_type == 'f':
+        return ApproxQlearner()
+    if agent_type == 'v':
+        agent = ValueIterationAgent(gamma=0.9)
+        agent.compute_value_iteration()
+        return agent
+    if agent_type == 'p':
+        agent = PolicyIterationAgent(gamma=0.9)
+        agent.compute_policy_iteration(method='exact')
+        return agent
+    if agent_type == 'n':
+        return NegamaxAgent()
+    raise ValueError("Unknown agent type")
+
+
+def run_training(job_id, spec, events, cancel, progress_interval):
+    """
+    Worker process entry point. Returns 'complete' or 'cancelled'.
+
+    ``spec`` holds agent_type, path, method ('teacher' or 'self_play'),
+    episodes and load_existing, as sent by the training page.
+    """
+    agent = _make_agent(spec)
+    # The planning agents are solved while they are created; the search agent has nothing to learn
+    episodes = (spec.get('episodes') or 0) if spec['agent_type'] in LEARNING_TYPES else 0
+    teacher = Teacher() if spec.get('method') == 'teacher' else None
+    start = last_report = time.monotonic()
+    played = 0
+    while played < episodes:
+        if cancel.is_set():
+            return 'cancelled'
+        for _ in range(min(CHUNK, episodes - played)):
+            if teacher is not None:
+                game = Game(agent, player=teacher, player_type='teacher')
+            else:
+                game = Game(agent, agent, player_type='agent')
+            game.start()
+        played = min(played + CHUNK, episodes)
+
+        now = time.monotonic()
+        if now - last_report >= progress_interval or played == episodes:
+            last_report = now
+            rate = played / max(now - start, 1e-9)
+            recent = agent.history.recent(WIN_RATE_WINDOW)
+            events.put((job_id, 'progress', {
+                'episodes': played,
+                'total': episodes,
+                'episodes_per_sec': rate,
+                'eta': (episodes - played) / rate,
+                'win_rate': float((recent > 0).mean()) if len(recent) else 0.,
+            }))
+    if cancel.is_set():
+        return 'cancelled'
+    agent.save(spec['path'])
+    return 'complete'
+
+
+class TrainingJobs:
+    """
+    Parameters
+    ----------
+    max_workers : int
+        Jobs that train at the same time (default: 2)
+    max_jobs : int
+        Jobs that may be queued or running at once; ``submit`` refuses more
+        (default: 8)
+    progress_interval : float
+        Least number of seconds between progress events of a job (default: 0.5)
+    """
+
+    def __init__(self, max_workers=2, max_jobs=8, progress_interval=0.5):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.progress_interval = progress_interval
+        # Job id -> {'owner', 'future', 'cancel'}
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # Started on first submit so that importing the server starts no processes
+        self.pool = None
+        self.manager = None
+        self.events = None
+
+    def _start(self):
+        # Spawned workers do not inherit the server's sockets or event loop
+        context = multiprocessing.get_context('spawn')
+        self.manager = context.Manager()
+        self.events = self.manager.Queue()
+        self.pool = ProcessPoolExecutor(self.max_workers, mp_context=context)
+
+    def submit(self, spec, owner=None):
+        """Queue a training job; returns its id. ``owner`` is returned by ``poll``."""
+        # Checked here so a bad request fails at once rather than in a worker
+        if spec.get('agent_type') not in AGENT_TYPES:
+            raise ValueError(f"Unknown agent type: {spec.get('agent_type')!r} "
+                             f"(choose from {', '.join(AGENT_TYPES)})")
+        with self.lock:
+            if len(self.jobs) >= self.max_jobs:
+                raise ValueError("Too many training jobs, please try again later")
+            if self.pool is None:
+                self._start()
+            job_id = uuid.uuid4().hex
+            cancel = self.manager.Event()
+            future = self.pool.submit(run_training, job_id, dict(spec), self.events,
+                                      cancel, self.progress_interval)
+            self.jobs[job_id] = {'owner': owner, 'future': future, 'cancel': cancel}
+        return job_id
+
+    def cancel(self, job_id, owner=None):
+        """
+        Cancel a queued or running job. Returns False for unknown jobs, or
+        jobs of another owner when ``owner`` is given.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or (owner is not None and job['owner'] != owner):
+            return False
+        if not job['future'].cancel():
+            job['cancel'].set()
+        return True
+
+    def __len__(self):
+        # Jobs queued or running
+        return len(self.jobs)
+
+    def poll(self):
+        """
+        Progress and end events since the last call, oldest first.
+
+        Returns
+        -------
+        list
+            (job id, owner, event, data) tuples, where event is 'progress',
+            'complete', 'cancelled' or 'error'
+        """
+        if self.pool is None:
+            return []
+        # Take finished jobs before draining, so their last progress is still read
+        with self.lock:
+            finished = {job_id: job for job_id, job in self.jobs.items() if job['future'].done()}
+            for job_id in finished:
+                del self.jobs[job_id]
+
+        result = []
+        while True:
+            try:
+                job_id, event, data = self.events.get_nowait()
+            except queue.Empty:
+                break
+            job = self.jobs.get(job_id) or finished.get(job_id)
+            if job is not None:
+                result.append((job_id, job['owner'], event, data))
+
+        for job_id, job in finished.items():
+            future = job['future']
+            if future.cancelled():
+                result.append((job_id, job['owner'], 'cancelled', {}))
+            elif future.exception() is not None:
+                result.append((job_id, job['owner'], 'error', {'message': str(future.exception())}))
+            else:
+                result.append((job_id, job['owner'], future.result(), {}))
+        return result
+
+    def shutdown(self):
+        """Cancel every job and stop the workers; called when the server exits."""
+        with self.lock:
+            if self.pool is None:
+                return
+            for job in self.jobs.values():
+                # Queued jobs never start; running ones stop at their next check
+                job['future'].cancel()
+                job['cancel'].set()
+        self.pool.shutdown(wait=True)
+        self.manager.shutdown()
+        self.pool = None
@@ -0,0 +1,196 @@
+import functools
+import time
+
+import numpy as np
+
+from .bitboard import STANDARD
+from .states import solver_states
+
+
+def landing_rewards(space):
+    """
+    Reward for moving into each state of ``space`` under the VI/PI model:
+    1.0 if X has won, -1.0 if O has won, 0.0 for a draw and -0.01 otherwise.
+    """
+    rewards = []
+    for end, winner in zip(space.terminal, space.winner):
+        if not end:
+            rewards.append(-0.01)
+        elif winner == 'X':
+            rewards.append(1.0)
+        elif winner == 'O':
+            rewards.append(-1.0)
+        else:
+            rewards.append(0.0)
+    return rewards
+
+
+class CompiledMDP:
+    """
+    The VI/PI transition model compiled into NumPy arrays.
+
+    Row ``sid`` of each array describes state ``sid`` of the solver index and
+    column ``cell`` describes placing 'X' on that cell; there are
+    ``space.shape.size`` columns, nine on the 3x3 board.
+
+    Attributes
+    ----------
+    space : StateSpace
+        The state index the arrays are built over
+    successors : np.ndarray
+        int64 [N, cells] successor ids; illegal entries point at the state itself
+    rewards : np.ndarray
+        float64 [N, cells] reward for each move; 0 for illegal entries
+    mask : np.ndarray
+        bool [N, cells] legal-action mask
+    nonterminal : np.ndarray
+        bool [N] states that still have a move to play
+    """
+
+    def __init__(self, space):
+        self.space = space
+        n, size = len(space), space.shape.size
+        successors = np.array(space.successors['X'], dtype=np.int64).reshape(n, size)
+        self.mask = successors >= 0
+        self.successors = np.where(self.mask, successors, np.arange(n)[:, None])
+        landing = np.array(landing_rewards(space))
+        self.rewards = np.where(self.mask, landing[self.successors], 0.0)
+        self.nonterminal = ~np.array(space.terminal, dtype=bool)
+
+        # Ids are ordered by filled cells and every move fills one more, so
+        # grouping non-terminal states by fill count gives a topological order.
+        filled = np.array([size - key.count('-') for key in space.keys])
+        self.layers = [np.flatnonzero(self.nonterminal & (filled == k))
+                       for k in range(size - 1, -1, -1)]
+
+    def action_values(self, values, gamma):
+        """Q(s, a) for every state and cell, -inf where the move is illegal."""
+        q = self.rewards + gamma * values[self.successors]
+        return np.where(self.mask, q, -np.inf)
+
+    def value_iteration(self, gamma, theta, values=None):
+        """
+        Synchronous value iteration until the largest change is below ``theta``.
+
+        Returns the converged values and the number of sweeps taken.
+        """
+        if values is None:
+            values = np.zeros(len(self.space))
+        values = np.asarray(values, dtype=np.float64).copy()
+        rows = self.nonterminal
+        sweeps = 0
+        while True:
+            backup = self.action_values(values, gamma)[rows].max(axis=1)
+            delta = np.abs(backup - values[rows]).max()
+            values[rows] = backup
+            sweeps += 1
+            if delta < theta:
+                break
+        return values, sweeps
+
+    def retrograde(self, gamma):
+        """
+        Exact optimal values and policy by backward induction.
+
+        Every move fills a cell, so once the layers are visited from the
+        fullest boards to the empty board, each state's successors already
+        hold their final values. One greedy backup per state then gives the
+        exact solution, with no convergence threshold. Ties go to the lowest
+        cell, as in ``greedy``.
+
+        Returns the values, the cells (-1 for terminal states) and one
+        ``{'evaluation', 'improvement'}`` timing dict (seconds) for the pass.
+        """
+        values = np.zeros(len(self.space))
+        cells = np.full(len(self.space), -1, dtype=np.int64)
+        evaluation = improvement = 0.
+        for layer in self.layers:
+            start = time.perf_counter()
+            q = np.where(self.mask[layer],
+                         self.rewards[layer] + gamma * values[self.successors[layer]], -np.inf)
+            best = q.argmax(axis=1)
+            improved = time.perf_counter()
+            cells[layer] = best
+            values[layer] = q[np.arange(len(layer)), best]
+            evaluation += time.perf_counter() - improved
+            improvement += improved - start
+        return values, cells, {'evaluation': evaluation, 'improvement': improvement}
+
+    def evaluate(self, cells, gamma, theta=None, values=None):
+        """
+        Value of the fixed policy ``cells`` (one cell per state, -1 if terminal).
+
+        A deterministic policy turns evaluation into the sparse linear system
+        ``(I - gamma * P) V = r`` with one successor per row. Because every
+        successor has more filled cells, the system is triangular in the
+        layer order and is solved exactly by back-substitution, one array
+        operation per layer. If ``theta`` is given, synchronous vectorized
+        sweeps starting from ``values`` are run until the largest change is
+        below ``theta`` instead.
+        """
+        rows = np.arange(len(self.space))
+        picked = np.maximum(cells, 0)
+        successors = self.successors[rows, picked]
+        rewards = self.rewards[rows, picked]
+
+        if values is None:
+            values = np.zeros(len(self.space))
+        values = np.asarray(values, dtype=np.float64).copy()
+
+        if theta is None:
+            for layer in self.layers:
+                values[layer] = rewards[layer] + gamma * values[successors[layer]]
+            return values
+
+        active = self.nonterminal
+        while True:
+            backup = rewards[active] + gamma * values[successors[active]]
+            delta = np.abs(backup - values[active]).max()
+            values[active] = backup
+            if delta < theta:
+                return values
+
+    def policy_iteration(self, gamma, cells, theta=None, values=None):
+        """
+        Alternate ``evaluate`` and greedy improvement until the policy is stable.
+
+        Values carry over from one outer iteration to the next. Returns the
+        final values, the final cells and one ``{'evaluation', 'improvement'}``
+        timing dict (seconds) per outer iteration.
+        """
+        timings = []
+        while True:
+            start = time.perf_counter()
+            values = self.evaluate(cells, gamma, theta, values)
+            evaluated = time.perf_counter()
+            improved = self.greedy(values, gamma)
+            timings.append({'evaluation': evaluated - start,
+                            'improvement': time.perf_counter() - evaluated})
+            stable = np.array_equal(improved, cells)
+            cells = improved
+            if stable:
+                return values, cells, timings
+
+    def greedy(self, values, gamma):
+        """
+        Best cell per state under ``values``, -1 for terminal states.
+        Ties go to the lowest cell, like the sweep-based solvers.
+        """
+        cells = self.action_values(values, gamma).argmax(axis=1)
+        return np.where(self.nonterminal, cells, -1)
+
+    def policy_dict(self, cells):
+        """Turn an array of cells into the ``{state: (row, col)}`` policy format."""
+        keys, action_of = self.space.keys, self.space.shape.action_of
+        return {keys[sid]: action_of(cell)
+                for sid, cell in enumerate(cells.tolist()) if cell >= 0}
+
+
+def compiled_mdp(canonical=False, shape=STANDARD):
+    """The compiled model over ``solver_states(canonical, shape)``, built once per process."""
+    return _compiled_mdp(canonical, shape)
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_mdp(canonical, shape):
+    return CompiledMDP(solver_states(canonical, shape))
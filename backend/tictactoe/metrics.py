@@ -0,0 +1,243 @@
+"""
+Counters and latency histograms for the hot paths, exported in the
+Prometheus text format.
+
+Instrumentation is off unless the web server turns it on with ``enable``,
+or the environment variable TICTACTOE_METRICS is set to '1' when this module
+is first imported; TICTACTOE_METRICS=0 keeps it off even in the server. When
+it is off, ``timed`` returns the function it decorates unchanged, so timed
+code costs nothing. Counters incremented directly still count; they sit off
+the hot paths.
+
+Updates take no lock, which would cost more than the calls they time; with
+threads an update may rarely be lost to a race, which monitoring tolerates.
+Metrics live in the process that records them: training jobs and parallel
+workers run in their own processes, and report through their own channels.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('TICTACTOE_METRICS') == '1'
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Histogram:
+    """
+    Parameters
+    ----------
+    buckets : tuple of float
+        Ascending upper bounds; larger values fall in a final +Inf bucket
+        (default: ``LATENCY_BUCKETS``)
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Per-bucket counts; rendered cumulatively, as Prometheus expects
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+                          for k, v in pairs) + '}'
+
+
+class Registry:
+    """ Named metric families, each holding one metric per label set. """
+
+    def __init__(self):
+        # Name -> {'kind', 'help', 'series': {labels: metric}} in creation order
+        self.families = {}
+        # Name -> (kind, help, callable returning [(labels dict, value)])
+        self.callbacks = {}
+        self.lock = threading.Lock()
+
+    def _get(self, name, kind, help, labels, make):
+        key = _labels(labels)
+        family = self.families.get(name)
+        if family is None or key not in family['series']:
+            with self.lock:
+                family = self.families.setdefault(name, {'kind': kind, 'help': help, 'series': {}})
+                if family['kind'] != kind:
+                    raise ValueError(f"Metric {name} is already a {family['kind']}")
+                family['series'].setdefault(key, make())
+        return family['series'][key]
+
+    def counter(self, name, help, **labels):
+        """The counter of ``name`` with these labels, created on first use."""
+        return self._get(name, 'counter', help, labels, Counter)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        """The histogram of ``name`` with these labels, created on first use."""
+        return self._get(name, 'histogram', help, labels, lambda: Histogram(buckets))
+
+    def collect(self, name, help, kind, fn):
+        """
+        Export values computed at render time, such as sizes or counts kept
+        elsewhere. ``fn()`` returns a list of (labels dict, value) pairs.
+        """
+        with self.lock:
+            self.callbacks[name] = (kind, help, fn)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, family in list(self.families.items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            for key, metric in list(family['series'].items()):
+                if family['kind'] == 'counter':
+                    lines.append(f"{name}{_format_labels(key)} {metric.value}")
+                    continue
+                counts, total = list(metric.counts), metric.sum
+                cumulative = 0
+                for bound, n in zip(metric.buckets + (float('inf'),), counts):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total!r}")
+                lines.append(f"{name}_count{_format_labels(key)} {cumulative}")
+        for name, (kind, help, fn) in list(self.callbacks.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in fn():
+                lines.append(f"{name}{_format_labels(_labels(labels))} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Current totals, for ``summary``: series name -> value for counters,
+        (count, sum) for histograms.
+        """
+        result = {}
+        for name, family in list(self.families.items()):
+            for key, metric in list(family['series'].items()):
+                series = name + _format_labels(key)
+                if family['kind'] == 'counter':
+                    result[series] = metric.value
+                else:
+                    result[series] = (metric.count, metric.sum)
+        return result
+
+    def summary(self, before, after, seconds):
+        """
+        One line per series that changed between two snapshots taken
+        ``seconds`` apart: its rate and, for histograms, the mean latency.
+        """
+        lines = []
+        for series, value in after.items():
+            if isinstance(value, tuple):
+                count, total = value
+                old_count, old_total = before.get(series, (0, 0.))
+                calls = count - old_count
+                if calls:
+                    mean = (total - old_total) / calls
+                    lines.append(f"{series}: {calls / seconds:.1f}/s, mean {mean * 1e6:.1f} us")
+            else:
+                delta = value - before.get(series, 0)
+                if delta:
+                    lines.append(f"{series}: {delta / seconds:.1f}/s")
+        return '\n'.join(lines)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+collect = REGISTRY.collect
+render = REGISTRY.render
+snapshot = REGISTRY.snapshot
+summary = REGISTRY.summary
+
+
+def enable():
+    """
+    Turn instrumentation on, unless TICTACTOE_METRICS is '0'. Only functions
+    decorated afterwards are timed, so call it before importing them.
+    """
+    global ENABLED
+    ENABLED = os.environ.get('TICTACTOE_METRICS', '1') != '0'
+
+
+def timed(name, help, label=None, **labels):
+    """
+    Decorator recording the latency of every call in the histogram ``name``.
+
+    Parameters
+    ----------
+    name, help : str
+        Histogram name and description
+    label : tuple
+        Optional (label name, function) pair; the function is called with the
+        first argument of each call (``self`` for methods) and its result is
+        used as the value of that label, e.g. the class of the agent
+    **labels
+        Fixed labels of the histogram
+
+    Returns the function unchanged when instrumentation is off.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        if label is None:
+            observe = histogram(name, help, **labels).observe
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    observe(time.perf_counter() - start)
+            return wrapper
+
+        label_name, label_of = label
+        # Label value -> observe method, so each call costs one dict lookup
+        observers = {}
+
+        @functools.wraps(fn)
+        def wrapper(first, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(first, *args, **kwargs)
+            finally:
+                value = label_of(first)
+                observe = observers.get(value)
+                if observe is None:
+                    observe = observers[value] = histogram(
+                        name, help, **labels, **{label_name: value}).observe
+                observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# Label for methods of agents: the class of the agent
+AGENT_LABEL = ('agent', lambda agent: type(agent).__name__)
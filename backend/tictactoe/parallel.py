@@ -0,0 +1,111 @@
+"""
+Multi-process training for the tabular learners.
+
+Episodes are split into rounds. In each round every worker process trains
+its own copy of the master agent for ``sync_every`` episodes. The master then
+merges the copies back by visit-weighted averaging: each Q entry moves to the
+average of the worker values, weighted by how often each worker updated it.
+Entries no worker touched keep the master's value.
+"""
+import copy
+import multiprocessing
+import random
+
+import numpy as np
+
+from .game import Game
+from .teacher import Teacher
+from .vecenv import BatchedGames
+
+
+def _train_shard(agent, episodes, opponent, batch_size, seed):
+    # Runs in a worker process; every worker gets its own seed
+    random.seed(seed)
+    np.random.seed(seed)
+    agent.Q.count_visits()
+    if batch_size:
+        BatchedGames(agent, batch_size, opponent, seed=seed).play(episodes)
+    else:
+        teacher = Teacher()
+        for _ in range(episodes):
+            if opponent == 'teacher':
+                game = Game(agent, player=teacher, player_type='teacher')
+            else:
+                game = Game(agent, agent, player_type='agent')
+            game.start()
+    return agent.Q.table, agent.Q.visits, agent.history.outcomes(), agent.eps
+
+
+def merge_q_tables(base, tables, visits):
+    """
+    Visit-weighted average of worker tables that all started from ``base``.
+    Entries no worker visited keep their ``base`` value.
+    """
+    total = np.zeros(base.shape, dtype=np.float64)
+    weighted = np.zeros(base.shape, dtype=np.float64)
+    for table, count in zip(tables, visits):
+        touched = count > 0
+        weighted[touched] += count[touched] * (table[touched].astype(np.float64) - base[touched])
+        total += count
+    merged = base.copy()
+    touched = total > 0
+    merged[touched] = base[touched] + weighted[touched] / total[touched]
+    return merged
+
+
+def train_parallel(agent, episodes, workers, opponent='teacher', sync_every=5000,
+                   batch_size=None, seed=None, callback=None):
+    """
+    Train ``agent`` for ``episodes`` games spread over ``workers`` processes.
+
+    Parameters
+    ----------
+    agent : Learner
+        Q-learning or SARSA agent; it is moved to the 'array' Q store
+    episodes : int
+        Total number of games
+    workers : int
+        Number of worker processes
+    opponent : str
+        'teacher' or 'self' (default: 'teacher')
+    sync_every : int
+        Games each worker plays between merges (default: 5000)
+    batch_size : int
+        If given, workers train with ``BatchedGames`` on this many boards
+    seed : int
+        Root seed; every worker gets an independent stream derived from it
+    callback : callable
+        Called with the number of games played after every merge
+    """
+    agent.use_q_store('array')
+    streams = np.random.SeedSequence(seed).spawn(workers)
+    played = 0
+    with multiprocessing.Pool(workers) as pool:
+        while played < episodes:
+            shards = []
+            remaining = episodes - played
+            for w in range(workers):
+                n = min(sync_every, remaining)
+                remaining -= n
+                if n:
+                    shards.append((w, n))
+
+            worker_agent = copy.copy(agent)
+            jobs = [(worker_agent, n, opponent, batch_size,
+                     int(streams[w].spawn(1)[0].generate_state(1)[0]))
+                    for w, n in shards]
+            results = pool.starmap(_train_shard, jobs)
+
+            tables, visits, outcomes, eps = zip(*results)
+            agent.Q.table = merge_q_tables(agent.Q.table, tables, visits)
+            for r in outcomes:
+                agent.history.record_many(r)
+            # Each worker decayed epsilon on its own; apply all the decay steps
+            for e in eps:
+                if worker_agent.eps:
+                    agent.eps *= e / worker_agent.eps
+
+            played += sum(n for _, n in shards)
+            if callback is not None:
+                callback(played)
+    return played
@@ -0,0 +1,139 @@
+"""
+Q-value models for the function-approximation learner.
+
+A model maps the features of a batch of boards to one Q-value per cell, and
+takes gradient steps on the squared error between the values of the played
+cells and their targets. Features are three one-hot planes over the cells,
+for 'X', 'O' and empty, built from the state keys in one vectorized pass, so
+the size of a model depends on the board and not on the states seen.
+
+Weights are float32 arrays; ``arrays`` and ``from_arrays`` move them in and
+out of agent files.
+"""
+import numpy as np
+
+_X, _O, _EMPTY = (ord(c) for c in 'XO-')
+
+
+def features(keys, size):
+    """
+    Feature rows of state keys.
+
+    Parameters
+    ----------
+    keys : list of str
+        State keys of one board size
+    size : int
+        Cells per board
+
+    Returns
+    -------
+    numpy.ndarray
+        ``float32[len(keys), 3*size]``: the 'X', 'O' and empty planes
+    """
+    codes = np.frombuffer(''.join(keys).encode('ascii'), dtype=np.uint8).reshape(len(keys), size)
+    return np.concatenate([codes == _X, codes == _O, codes == _EMPTY], axis=1).astype(np.float32)
+
+
+def legal_mask(X, size):
+    """Empty cells of feature rows, as a bool array."""
+    return X[:, 2*size:] > 0
+
+
+class LinearQ:
+    """
+    Q = X W + b.
+
+    Parameters
+    ----------
+    n_features, n_actions : int
+        Input features and output cells
+    """
+
+    kind = 'linear'
+
+    def __init__(self, n_features, n_actions):
+        self.W = np.zeros((n_features, n_actions), dtype=np.float32)
+        self.b = np.zeros(n_actions, dtype=np.float32)
+
+    def forward(self, X):
+        return X @ self.W + self.b
+
+    def step(self, X, cells, targets, alpha):
+        """One gradient step on the mean squared error of the played cells."""
+        rows = np.arange(len(X))
+        error = np.zeros((len(X), self.b.size), dtype=np.float32)
+        error[rows, cells] = self.forward(X)[rows, cells] - targets
+        self.W -= alpha * (X.T @ error) / len(X)
+        self.b -= alpha * error.sum(axis=0) / len(X)
+
+    def arrays(self):
+        return {'W': self.W, 'b': self.b}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        model = cls(*arrays['W'].shape)
+        model.W[:] = arrays['W']
+        model.b[:] = arrays['b']
+        return model
+
+
+class MLPQ:
+    """
+    One hidden ReLU layer: Q = relu(X W1 + b1) W2 + b2.
+
+    Parameters
+    ----------
+    n_features, n_actions : int
+        Input features and output cells
+    hidden : int
+        Units of the hidden layer (default: 64)
+    """
+
+    kind = 'mlp'
+
+    def __init__(self, n_features, n_actions, hidden=64):
+        # He initialization for the ReLU layer, small output weights
+        self.W1 = (np.random.standard_normal((n_features, hidden)) *
+                   np.sqrt(2. / n_features)).astype(np.float32)
+        self.b1 = np.zeros(hidden, dtype=np.float32)
+        self.W2 = (np.random.standard_normal((hidden, n_actions)) * 0.01).astype(np.float32)
+        self.b2 = np.zeros(n_actions, dtype=np.float32)
+
+    def forward(self, X):
+        return np.maximum(X @ self.W1 + self.b1, 0.) @ self.W2 + self.b2
+
+    def step(self, X, cells, targets, alpha):
+        """One backpropagation step on the mean squared error of the played cells."""
+        rows = np.arange(len(X))
+        H = np.maximum(X @ self.W1 + self.b1, 0.)
+        error = np.zeros((len(X), self.b2.size), dtype=np.float32)
+        error[rows, cells] = (H @ self.W2 + self.b2)[rows, cells] - targets
+        back = (error @ self.W2.T) * (H > 0)
+        scale = alpha / len(X)
+        self.W2 -= scale * (H.T @ error)
+        self.b2 -= scale * error.sum(axis=0)
+        self.W1 -= scale * (X.T @ back)
+        self.b1 -= scale * back.sum(axis=0)
+
+    def arrays(self):
+        return {'W1': self.W1, 'b1': self.b1, 'W2': self.W2, 'b2': self.b2}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        model = cls(arrays['W1'].shape[0], arrays['W2'].shape[1], arrays['W1'].shape[1])
+        for name in ('W1', 'b1', 'W2', 'b2'):
+            getattr(model, name)[:] = arrays[name]
+        return model
+
+
+MODELS = {cls.kind: cls for cls in (LinearQ, MLPQ)}
+
+
+def make_model(kind, size, hidden=64):
+    """A new model of ``kind`` ('linear' or 'mlp') for boards of ``size`` cells."""
+    if kind == 'linear':
+        return LinearQ(3*size, size)
+    if kind == 'mlp':
+        return MLPQ(3*size, size, hidden)
+    raise ValueError(f"Unknown model: {kind}")
@@ -0,0 +1,201 @@
+"""
+Q-value stores for the tabular learners.
+
+Both stores answer the same questions about a state key ``s`` and an action
+``a = (row, col)``; the learners only talk to them through these methods, so
+either can back ``Learner.Q``.
+"""
+import collections
+
+import numpy as np
+
+from .bitboard import STANDARD, action_of, cell_of, legal_actions
+from .states import game_states
+
+_ACTIONS = tuple(action_of(cell) for cell in range(9))
+
+
+class DictQTable(dict):
+    """
+    The original layout: one ``defaultdict(int)`` per action, keyed by state.
+
+    It is a dict subclass so ``Q[a][s]`` keeps working, and so agents pickled
+    before the stores existed (whose ``Q`` is a plain dict) can be wrapped
+    without copying.
+    """
+
+    # Legal actions of a state key; tables for other boards set their own
+    legal_actions = staticmethod(legal_actions)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for cell in range(9):
+            self.setdefault(action_of(cell), collections.defaultdict(int))
+
+    @classmethod
+    def for_shape(cls, shape):
+        """Empty table for the states of the board ``shape``."""
+        Q = cls()
+        if not shape.standard:
+            Q.legal_actions = shape.legal_actions
+            for cell in range(shape.size):
+                Q.setdefault(shape.action_of(cell), collections.defaultdict(int))
+        return Q
+
+    def value(self, s, a):
+        return self[a][s]
+
+    def action_values(self, s):
+        """Values of the legal actions of ``s``, in cell order."""
+        return [self[a][s] for a in self.legal_actions(s)]
+
+    def max_value(self, s):
+        return max(self.action_values(s))
+
+    def best_actions(self, s):
+        """Legal actions of ``s`` tied for the highest value, in cell order."""
+        actions = self.legal_actions(s)
+        values = [self[a][s] for a in actions]
+        best = max(values)
+        return [a for a, v in zip(actions, values) if v == best]
+
+    def update(self, s, a, target, alpha):
+        self[a][s] += alpha*(target - self[a][s])
+
+
+class ArrayQTable:
+    """
+    Q-values in one contiguous ``float32[num_states, 9]`` array.
+
+    Rows follow the dense ids of ``game_states()``, columns are cells, and
+    illegal moves hold -inf so a plain row max/argmax only sees legal moves.
+    Only the array is pickled; the key index is rebuilt on load.
+
+    If ``visits`` is set to a zeroed array of the table's shape (see
+    ``count_visits``), every update also counts the entry it touched.
+    """
+
+    def __init__(self, space=None, dtype=np.float32):
+        space = space or game_states()
+        self.index = space.index
+        self.table = np.full((len(space), 9), -np.inf, dtype=dtype)
+        for sid, cells in enumerate(space.actions):
+            self.table[sid, list(cells)] = 0.
+        self.visits = None
+
+    def count_visits(self):
+        """Start counting updates per entry from zero."""
+        self.visits = np.zeros(self.table.shape, dtype=np.int64)
+
+    @classmethod
+    def from_array(cls, table):
+        """Wrap an existing table, e.g. one mapped from an agent file."""
+        store = cls.__new__(cls)
+        store.__setstate__({'table': table})
+        return store
+
+    @classmethod
+    def from_dict(cls, Q, dtype=np.float32):
+        """
+        Build an array store from a dict-based ``Q`` (``{action: {state: value}}``).
+        Entries for states outside the game index or for taken cells are dropped.
+        """
+        store = cls(dtype=dtype)
+        for a, column in Q.items():
+            cell = cell_of(a)
+            for s, value in column.items():
+                sid = store.index.get(s)
+                if sid is not None and s[cell] == '-':
+                    store.table[sid, cell] = value
+        return store
+
+    def to_dict(self):
+        """
+        The inverse of ``from_dict``. Only legal moves of states with a move
+        to play get entries; finished games and taken cells, held as -inf in
+        the array, have none in the dict layout.
+        """
+        Q = DictQTable()
+        actions = game_states().actions
+        for s, sid in self.index.items():
+            row = self.table[sid].tolist()
+            for cell in actions[sid]:
+                Q[_ACTIONS[cell]][s] = row[cell]
+        return Q
+
+    def __getstate__(self):
+        return {'table': self.table}
+
+    def __setstate__(self, state):
+        self.table = state['table']
+        self.index = game_states().index
+        self.visits = None
+
+    def value(self, s, a):
+        return float(self.table[self.index[s], cell_of(a)])
+
+    def action_values(self, s):
+        row = self.table[self.index[s]].tolist()
+        return [row[cell_of(a)] for a in legal_actions(s)]
+
+    # Single rows are only nine floats, so they are reduced as Python lists;
+    # NumPy call overhead would dominate at this size.
+    def max_value(self, s):
+        return max(self.table[self.index[s]].tolist())
+
+    def best_actions(self, s):
+        row = self.table[self.index[s]].tolist()
+        best = max(row)
+        return [_ACTIONS[c] for c, v in enumerate(row) if v == best]
+
+    def update(self, s, a, target, alpha):
+        sid, cell = self.index[s], cell_of(a)
+        value = float(self.table[sid, cell])
+        self.table[sid, cell] = value + alpha*(target - value)
+        if self.visits is not None:
+            self.visits[sid, cell] += 1
+
+    def update_batch(self, sids, cells, targets, alpha):
+        """
+        Apply ``update`` for many transitions at once.
+
+        Transitions that hit the same (state, action) entry are applied one
+        after another in rounds, so repeated entries compound exactly as a
+        sequence of single updates would instead of overwriting each other.
+        """
+        flat = np.asarray(sids) * 9 + np.asarray(cells)
+        if self.visits is not None:
+            np.add.at(self.visits.reshape(-1), flat, 1)
+        targets = np.asarray(targets, dtype=np.float64)
+        order = np.argsort(flat, kind='stable')
+        flat, targets = flat[order], targets[order]
+        # Position of each transition within its run of equal entries
+        starts = np.r_[True, flat[1:] != flat[:-1]]
+        rank = np.arange(len(flat)) - np.maximum.accumulate(np.where(starts, np.arange(len(flat)), 0))
+
+        table = self.table.reshape(-1)
+        for k in range(rank.max() + 1 if len(flat) else 0):
+            picked = rank == k
+            entries = flat[picked]
+            values = table[entries].astype(np.float64)
+            table[entries] = values + alpha*(targets[picked] - values)
+
+
+def make_q_table(kind='dict', shape=STANDARD):
+    """Empty Q store of the given kind ('dict' or 'array') for the board ``shape``."""
+    if kind == 'dict':
+        return DictQTable.for_shape(shape)
+    if kind == 'array':
+        if not shape.standard:
+            raise ValueError("The array Q store only supports the 3x3 board")
+        return ArrayQTable()
+    raise ValueError("Unknown Q store")
+
+
+def convert_q_table(Q, kind):
+    """Return ``Q`` as a store of the given kind, migrating entries if needed."""
+    if kind == 'array':
+        return Q if isinstance(Q, ArrayQTable) else ArrayQTable.from_dict(Q)
+    if kind == 'dict':
+        return Q.to_dict() if isinstance(Q, ArrayQTable) else DictQTable(Q)
+    raise ValueError("Unknown Q store")
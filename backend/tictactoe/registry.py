@@ -0,0 +1,88 @@
+"""
+Process-wide cache of loaded agents.
+
+Each agent type is loaded once and the same instance is handed to every
+caller. Before returning a cached agent the registry stats its file; if the
+file changed (or appeared) since the agent was loaded, the agent is loaded
+again, along with its reward history. ``Learner.save`` writes the history
+before the agent file, so a changed agent file means both are complete.
+Agents are meant to be used read-only: ``Learner.load`` maps their arrays
+read-only, and callers must not train them.
+"""
+import os
+import threading
+import time
+
+
+def file_signature(path):
+    """(mtime, size) of the agent file, None if it is missing."""
+    # Not the reward history: a reload on it alone would pair it with the old agent
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class AgentRegistry:
+    """
+    Parameters
+    ----------
+    paths : dict
+        Agent type -> path of its agent file
+    loader : callable
+        ``loader(agent_type, path)`` returns the agent; it is also called when
+        the file does not exist, and that agent is cached until the file appears.
+        Each loaded agent's ``prepare_for_play`` is called before it is handed
+        out, so its first move is as fast as the rest
+    """
+
+    def __init__(self, paths, loader):
+        self.paths = dict(paths)
+        self.loader = loader
+        # Agent type -> (file signature, agent)
+        self.entries = {}
+        self.locks = {agent_type: threading.Lock() for agent_type in self.paths}
+        self.counters = {agent_type: {'hits': 0, 'misses': 0, 'load_seconds': 0.}
+                         for agent_type in self.paths}
+        self.counters_lock = threading.Lock()
+
+    def get(self, agent_type):
+        return self.entry(agent_type)[1]
+
+    def entry(self, agent_type):
+        """(file signature, agent); the signature identifies the agent's version."""
+        if agent_type not in self.paths:
+            raise ValueError("Unknown agent type")
+        path = self.paths[agent_type]
+        signature = file_signature(path)
+        entry = self.entries.get(agent_type)
+        if entry is None or entry[0] != signature:
+            # One load per type at a time; callers that waited reuse its result
+            with self.locks[agent_type]:
+                entry = self.entries.get(agent_type)
+                if entry is None or entry[0] != signature:
+                    start = time.perf_counter()
+                    agent = self.loader(agent_type, path)
+                    agent.prepare_for_play()
+                    entry = (signature, agent)
+                    self.entries[agent_type] = entry
+                    self._count(agent_type, 'misses', time.perf_counter() - start)
+                    return entry
+        self._count(agent_type, 'hits')
+        return entry
+
+    def warm(self):
+        """Load and prepare every agent type now rather than on first use."""
+        for agent_type in self.paths:
+            self.get(agent_type)
+
+    def _count(self, agent_type, counter, seconds=0.):
+        with self.counters_lock:
+            self.counters[agent_type][counter] += 1
+            self.counters[agent_type]['load_seconds'] += seconds
+
+    def stats(self):
+        """Hit/miss counts and total load time per agent type."""
+        with self.counters_lock:
+            return {agent_type: dict(c) for agent_type, c in self.counters.items()}
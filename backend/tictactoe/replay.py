@@ -0,0 +1,100 @@
+"""
+Experience replay for the tabular learners.
+
+Transitions are kept in a fixed-capacity ring buffer of preallocated NumPy
+arrays, one slot per transition, over the dense state ids of
+``game_states()``; once full, the oldest transitions are overwritten.
+Minibatches are drawn uniformly, or in proportion to the size of each
+transition's last TD error (prioritized replay), with importance-sampling
+weights that undo the bias of the prioritized draw.
+"""
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Parameters
+    ----------
+    capacity : int
+        Transitions kept
+    prioritized : bool
+        Sample in proportion to ``priority ** alpha`` (default: False)
+    alpha : float
+        How strongly priorities skew the draw; 0 is uniform (default: 0.6)
+    beta : float
+        Strength of the importance-sampling correction; 1 undoes the skew
+        fully (default: 0.4)
+    rng : numpy.random.Generator
+        Source of the draws (default: a new unseeded generator)
+    """
+
+    def __init__(self, capacity, prioritized=False, alpha=0.6, beta=0.4, rng=None):
+        if capacity < 1:
+            raise ValueError("Replay capacity must be positive")
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.rng = rng or np.random.default_rng()
+        self.states = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        # Next state and the action taken there (for SARSA); -1 and 0 when done
+        self.next_states = np.full(capacity, -1, dtype=np.int32)
+        self.next_actions = np.zeros(capacity, dtype=np.int8)
+        self.done = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity, dtype=np.float64)
+        self.max_priority = 1.
+        # Transitions added so far; the next one goes to slot added % capacity
+        self.added = 0
+
+    def __len__(self):
+        return min(self.added, self.capacity)
+
+    def add(self, s, a, r, s_, a_, done):
+        """
+        Store one transition: state id, cell, reward, next state id and the
+        cell played there. New transitions get the highest priority seen so
+        they are drawn at least once.
+        """
+        i = self.added % self.capacity
+        self.states[i] = s
+        self.actions[i] = a
+        self.rewards[i] = r
+        self.next_states[i] = -1 if done else s_
+        self.next_actions[i] = 0 if done else a_
+        self.done[i] = done
+        if self.prioritized:
+            self.priorities[i] = self.max_priority
+        self.added += 1
+
+    def sample(self, n):
+        """
+        Draw a minibatch.
+
+        Returns
+        -------
+        tuple
+            (slots, weights): ``int64[n]`` slots of the drawn transitions and
+            their ``float64[n]`` importance-sampling weights, scaled so the
+            largest is 1; all ones for uniform sampling
+        """
+        size = len(self)
+        if not self.prioritized:
+            return self.rng.integers(0, size, n), np.ones(n)
+        p = self.priorities[:size] ** self.alpha
+        p /= p.sum()
+        slots = np.searchsorted(np.cumsum(p), self.rng.random(n) * (1. - 1e-12))
+        weights = (size * p[slots]) ** -self.beta
+        return slots, weights / weights.max()
+
+    def batch(self, slots):
+        """(s, s_, a, a_, r) arrays of the given slots, as ``update_batch`` takes them."""
+        return (self.states[slots], self.next_states[slots], self.actions[slots],
+                self.next_actions[slots], self.rewards[slots].astype(np.float64))
+
+    def update_priorities(self, slots, errors):
+        """Set the priorities of drawn transitions from their new TD errors."""
+        if self.prioritized:
+            self.priorities[slots] = np.abs(errors) + 1e-3
+            self.max_priority = max(self.max_priority, float(self.priorities[slots].max()))
@@ -0,0 +1,70 @@
+"""
+Live games of the web app, keyed by Socket.IO session id.
+
+A game is stored as its bitboard state id, the agent type the player picked
+and the time of its last move. Agents are not stored with the games; every
+game of a type shares one agent (see registry.py). Games idle for longer than
+``idle_timeout`` are dropped by ``evict_idle``, and at most ``max_games`` are
+kept at once.
+"""
+import threading
+import time
+
+from . import bitboard
+
+
+class GameSessions:
+    """
+    Parameters
+    ----------
+    max_games : int
+        Most games kept at once; ``start`` refuses new sessions beyond it
+        (default: 10000)
+    idle_timeout : float
+        Seconds without a move after which a game is evicted (default: 1800)
+    """
+
+    def __init__(self, max_games=10000, idle_timeout=1800.):
+        self.max_games = max_games
+        self.idle_timeout = idle_timeout
+        # Session id -> (state id, agent type, time of last move)
+        self.games = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.games)
+
+    def start(self, sid, agent_type):
+        """Start an empty game for ``sid``. Returns False if the store is full."""
+        with self.lock:
+            if sid not in self.games and len(self.games) >= self.max_games:
+                return False
+            self.games[sid] = (0, agent_type, time.monotonic())
+            return True
+
+    def get(self, sid):
+        """(x, o, agent type) of the game of ``sid``, or None if it has none."""
+        entry = self.games.get(sid)
+        if entry is None:
+            return None
+        x, o = bitboard.from_state_id(entry[0])
+        return x, o, entry[1]
+
+    def update(self, sid, x, o):
+        with self.lock:
+            entry = self.games.get(sid)
+            if entry is not None:
+                self.games[sid] = (bitboard.state_id(x, o), entry[1], time.monotonic())
+
+    def end(self, sid):
+        with self.lock:
+            self.games.pop(sid, None)
+
+    def evict_idle(self):
+        """Drop games idle for longer than ``idle_timeout``; returns how many."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self.lock:
+            idle = [sid for sid, entry in self.games.items() if entry[2] < cutoff]
+            for sid in idle:
+                del self.games[sid]
+        return len(idle)
@@ -0,0 +1,163 @@
+import functools
+
+from . import bitboard
+from .symmetry import canonical_key, canonical_masks
+
+
+EMPTY = '-' * 9
+# Most states a StateSpace enumerates before giving up
+MAX_STATES = 500000
+
+
+def legal_movers(x, o):
+    """Marks that may be placed next in a real game where either side can open."""
+    nx, no = bin(x).count('1'), bin(o).count('1')
+    movers = []
+    if nx <= no:
+        movers.append('X')
+    if no <= nx:
+        movers.append('O')
+    return movers
+
+
+def x_movers(x, o):
+    """The model used by the VI/PI agents: only 'X' is ever placed."""
+    return ['X']
+
+
+class StateSpace:
+    """
+    Enumerated set of positions closed under a move rule.
+
+    Every position reachable from ``roots`` by placing one of the marks given
+    by ``movers`` on an empty cell is enumerated exactly once; nothing is
+    played after a win or on a full board. Positions get dense integer ids
+    ordered by the number of filled cells and then by key, so ids are stable
+    across runs.
+
+    Parameters
+    ----------
+    roots : iterable of str
+        Positions to start the enumeration from (default: the empty board)
+    movers : callable
+        Maps bitboards (x, o) to the list of marks that may be placed next
+        (default: ``legal_movers``)
+    canonical : bool
+        Keep only one representative per symmetry class, see symmetry.py;
+        successors then point at the representative; 3x3 board only
+        (default: False)
+    shape : bitboard.Shape
+        Board geometry (default: ``bitboard.STANDARD``, the 3x3 board)
+    max_states : int
+        Raise ValueError rather than enumerate more states than this
+        (default: ``MAX_STATES``)
+
+    Attributes
+    ----------
+    keys : list of str
+        Board string for each state id
+    index : dict
+        Board string -> state id
+    codes : list of int
+        Bitboard integer key (``bitboard.state_id``) for each state id
+    actions : list of tuple
+        Empty cells (0-8) for each state id, empty for terminal states
+    successors : dict
+        Mark -> list of ``shape.size``-tuples. ``successors[m][sid][cell]`` is the id of
+        the position after placing ``m`` on ``cell``, or -1 if the cell is
+        taken, the state is terminal, or the result is outside the space.
+    terminal : list of bool
+    winner : list of str or None
+    """
+
+    def __init__(self, roots=None, movers=legal_movers, canonical=False,
+                 shape=bitboard.STANDARD, max_states=MAX_STATES):
+        if canonical and not shape.standard:
+            raise ValueError("Symmetry is only supported on the 3x3 board")
+        self.canonical = canonical
+        self.shape = shape
+        seen = {shape.from_key(key) for key in roots or ('-' * shape.size,)}
+        if canonical:
+            seen = {canonical_masks(x, o)[:2] for x, o in seen}
+        stack = list(seen)
+        while stack:
+            x, o = stack.pop()
+            if shape.is_terminal(x, o):
+                continue
+            for mark in movers(x, o):
+                for cell in shape.empty_cells(x | o):
+                    child = (x | shape.cells[cell], o) if mark == 'X' else \
+                            (x, o | shape.cells[cell])
+                    if canonical:
+                        child = canonical_masks(*child)[:2]
+                    if child not in seen:
+                        seen.add(child)
+                        stack.append(child)
+            if len(seen) > max_states:
+                raise ValueError(f"The {shape.name} board has more than {max_states} states, "
+                                 "too many to enumerate")
+
+        self.keys = sorted((shape.to_key(x, o) for x, o in seen),
+                           key=lambda k: (shape.size - k.count('-'), k))
+        self.index = {key: sid for sid, key in enumerate(self.keys)}
+        masks = [shape.from_key(key) for key in self.keys]
+        self.codes = [shape.state_id(x, o) for x, o in masks]
+        self.winner = [shape.winner(x, o) for x, o in masks]
+        self.terminal = [shape.is_terminal(x, o) for x, o in masks]
+        self.actions = [() if end else shape.empty_cells(x | o)
+                        for (x, o), end in zip(masks, self.terminal)]
+
+        self.successors = {}
+        for mark in ('X', 'O'):
+            table = []
+            for key, cells in zip(self.keys, self.actions):
+                row = [-1] * shape.size
+                for cell in cells:
+                    child = key[:cell] + mark + key[cell+1:]
+                    if canonical:
+                        child = canonical_key(child)
+                    row[cell] = self.index.get(child, -1)
+                table.append(tuple(row))
+            self.successors[mark] = table
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def id_of(self, key):
+        """Return the dense id of a board string."""
+        return self.index[key]
+
+    def nonterminal(self):
+        """Ids of all states that still have a move to play."""
+        return [sid for sid, end in enumerate(self.terminal) if not end]
+
+
+def game_states(shape=bitboard.STANDARD):
+    """Positions reachable in a real game, with either side moving first."""
+    return _game_states(shape)
+
+
+@functools.lru_cache(maxsize=None)
+def _game_states(shape):
+    return StateSpace(shape=shape)
+
+
+def solver_states(canonical=False, shape=bitboard.STANDARD):
+    """
+    Positions the model-based agents reason over.
+
+    The VI/PI transition model only places 'X', so starting from every
+    legal game position it also reaches boards with surplus X's. Those are
+    kept so every backup stays inside the index. With ``canonical`` only one
+    position per symmetry class is kept.
+    """
+    return _solver_states(canonical, shape)
+
+
+@functools.lru_cache(maxsize=None)
+def _solver_states(canonical, shape):
+    return StateSpace(roots=game_states(shape).keys, movers=x_movers, canonical=canonical,
+                      shape=shape)
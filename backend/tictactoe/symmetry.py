@@ -0,0 +1,81 @@
+"""
+The eight rotations and reflections of the board.
+
+A position's canonical representative is the image with the smallest
+bitboard state id. Tables and solvers that opt in store only canonical
+positions and translate actions between the real and the canonical board.
+"""
+import functools
+
+from .bitboard import CELLS, action_of, cell_of, from_key, legal_actions, state_id, to_key
+
+
+def _cell_map(transform):
+    return tuple(r*3 + c for r, c in (transform(i // 3, i % 3) for i in range(9)))
+
+
+# MAPS[t][cell] is where transform t moves cell
+MAPS = tuple(_cell_map(f) for f in (
+    lambda r, c: (r, c),          # Identity
+    lambda r, c: (c, 2 - r),      # Rotate 90
+    lambda r, c: (2 - r, 2 - c),  # Rotate 180
+    lambda r, c: (2 - c, r),      # Rotate 270
+    lambda r, c: (r, 2 - c),      # Mirror left-right
+    lambda r, c: (2 - r, c),      # Mirror top-bottom
+    lambda r, c: (c, r),          # Main diagonal
+    lambda r, c: (2 - c, 2 - r),  # Anti-diagonal
+))
+INVERSE = tuple(tuple(m.index(j) for j in range(9)) for m in MAPS)
+
+# MASK_MAPS[t][mask] is the 9-bit mask moved by transform t
+MASK_MAPS = tuple(tuple(sum(CELLS[m[c]] for c in range(9) if mask & CELLS[c])
+                        for mask in range(512))
+                  for m in MAPS)
+
+
+def canonical_masks(x, o):
+    """Canonical (x, o) and the first transform that produces it."""
+    best = None
+    for t, table in enumerate(MASK_MAPS):
+        code = state_id(table[x], table[o])
+        if best is None or code < best[0]:
+            best = (code, t)
+    t = best[1]
+    return MASK_MAPS[t][x], MASK_MAPS[t][o], t
+
+
+@functools.lru_cache(maxsize=None)
+def canonical(key):
+    """
+    Canonical form of a 9-character key.
+
+    Returns
+    -------
+    tuple
+        (canonical key, transform, actions) where ``transform`` maps the
+        board onto the canonical key and ``actions`` maps each legal action
+        of ``key`` to a canonical action. Actions that are equivalent under
+        the position's own symmetries map to the same canonical action.
+    """
+    x, o = from_key(key)
+    codes = [state_id(table[x], table[o]) for table in MASK_MAPS]
+    best = min(codes)
+    transforms = [t for t, code in enumerate(codes) if code == best]
+    t = transforms[0]
+    actions = {a: action_of(min(MAPS[u][cell_of(a)] for u in transforms))
+               for a in legal_actions(key)}
+    return to_key(MASK_MAPS[t][x], MASK_MAPS[t][o]), t, actions
+
+
+def canonical_key(key):
+    return canonical(key)[0]
+
+
+def to_canonical(action, transform):
+    """Action on the real board -> the same move on the canonical board."""
+    return action_of(MAPS[transform][cell_of(action)])
+
+
+def from_canonical(action, transform):
+    """Action on the canonical board -> the same move on the real board."""
+    return action_of(INVERSE[transform][cell_of(action)])
@@ -0,0 +1,209 @@
+"""
+Tablebase: one byte per position for the player to move.
+
+Positions are described from the side to move as (mine, theirs) masks, where
+the opponent has as many stones or one more. Every such position has a rank
+in ``range(POSITIONS)`` given by a combinatorial perfect hash: positions are
+grouped by stone counts, and within a group ranked by the colex rank of
+``mine`` among all cells and of ``theirs`` among the cells left free. The
+same table serves 'X' and 'O'; ``player`` only decides which mask is mine.
+
+Each byte holds a move in the low four bits (``NO_MOVE`` when there is none)
+and the game-theoretic value for the side to move plus one in the high bits:
+0 for a loss, 1 for a draw and 2 for a win under perfect play.
+"""
+import functools
+from math import factorial
+
+import numpy as np
+
+from .bitboard import CELLS, EMPTY_CELLS, FULL, WINNING
+
+NO_MOVE = 15
+
+
+def comb(n, k):
+    # Binomial coefficient, 0 when k > n; math.comb needs Python 3.8
+    return factorial(n) // (factorial(k) * factorial(n - k)) if 0 <= k <= n else 0
+
+
+_POPCOUNT = tuple(bin(mask).count('1') for mask in range(512))
+
+# (mine, theirs) stone counts of the positions in the table, in rank order
+_COUNTS = tuple((m, t) for m in range(5) for t in (m, m + 1) if m + t <= 9)
+_BASE = {}
+POSITIONS = 0
+for _m, _t in _COUNTS:
+    _BASE[_m, _t] = POSITIONS
+    POSITIONS += comb(9, _m) * comb(9 - _m, _t)
+
+
+def _colex(mask):
+    return sum(comb(cell, i + 1) for i, cell in
+               enumerate(c for c in range(9) if mask & CELLS[c]))
+
+
+_COLEX = tuple(_colex(mask) for mask in range(512))
+
+# Array forms for the batch lookups
+_POPCOUNT_ARRAY = np.array(_POPCOUNT, dtype=np.int64)
+_COLEX_ARRAY = np.array(_COLEX, dtype=np.int64)
+_COMB_ARRAY = np.array([[comb(n, k) for k in range(10)] for n in range(10)], dtype=np.int64)
+_BASE_ARRAY = np.full((10, 10), -1, dtype=np.int64)
+for (_m, _t), _b in _BASE.items():
+    _BASE_ARRAY[_m, _t] = _b
+
+
+@functools.lru_cache(maxsize=None)
+def rank(mine, theirs):
+    """Rank of a position in the table, -1 if the stone counts are not covered."""
+    nm, nt = _POPCOUNT[mine], _POPCOUNT[theirs]
+    base = _BASE.get((nm, nt))
+    if base is None or mine & theirs:
+        return -1
+    sub, i = 0, 0
+    for k, cell in enumerate(EMPTY_CELLS[mine]):
+        if theirs & CELLS[cell]:
+            i += 1
+            sub += comb(k, i)
+    return base + _COLEX[mine] * comb(9 - nm, nt) + sub
+
+
+def ranks(mine, theirs):
+    """``rank`` for arrays of masks."""
+    mine = np.asarray(mine, dtype=np.int64)
+    theirs = np.asarray(theirs, dtype=np.int64)
+    nm, nt = _POPCOUNT_ARRAY[mine], _POPCOUNT_ARRAY[theirs]
+    base = _BASE_ARRAY[nm, nt]
+    free = np.zeros_like(mine)
+    chosen = np.zeros_like(mine)
+    sub = np.zeros_like(mine)
+    for cell in range(9):
+        empty = (mine >> cell & 1) == 0
+        taken = empty & ((theirs >> cell & 1) == 1)
+        chosen += taken
+        sub += np.where(taken, _COMB_ARRAY[free, chosen], 0)
+        free += empty
+    result = base + _COLEX_ARRAY[mine] * _COMB_ARRAY[9 - nm, nt] + sub
+    return np.where((base < 0) | (mine & theirs != 0), -1, result)
+
+
+def _positions():
+    # (mine, theirs) for every rank, in rank order
+    out = [None] * POSITIONS
+    for mine in range(512):
+        free = FULL & ~mine
+        theirs = free
+        while True:
+            r = rank(mine, theirs)
+            if r >= 0:
+                out[r] = (mine, theirs)
+            if not theirs:
+                break
+            theirs = (theirs - 1) & free
+    return out
+
+
+class Tablebase:
+    """
+    Parameters
+    ----------
+    table : numpy.ndarray
+        ``uint8[POSITIONS]`` of packed move and value bytes
+    """
+
+    def __init__(self, table):
+        self.table = table
+        # Single lookups index a bytes copy; indexing it returns a plain int
+        self.packed = table.tobytes()
+
+    @classmethod
+    def solve(cls):
+        """Perfect play; the fastest win or slowest loss, lowest cell on ties."""
+        scores = {}
+
+        def score(mine, theirs):
+            # Positive: the side to move wins, by more the sooner it does
+            key = (mine, theirs)
+            if key not in scores:
+                empties = 9 - _POPCOUNT[mine | theirs]
+                if WINNING[theirs]:
+                    scores[key] = -(empties + 1), NO_MOVE
+                elif WINNING[mine]:
+                    scores[key] = empties + 1, NO_MOVE
+                elif not empties:
+                    scores[key] = 0, NO_MOVE
+                else:
+                    best, neg_cell = max((-score(theirs, mine | CELLS[c])[0], -c)
+                                         for c in EMPTY_CELLS[mine | theirs])
+                    scores[key] = best, -neg_cell
+            return scores[key]
+
+        table = np.zeros(POSITIONS, dtype=np.uint8)
+        for r, (mine, theirs) in enumerate(_positions()):
+            s, cell = score(mine, theirs)
+            table[r] = cell | (int(np.sign(s)) + 1) << 4
+        return cls(table)
+
+    @classmethod
+    def from_moves(cls, move):
+        """
+        Perfect-play values with the moves of another policy. ``move(mine,
+        theirs)`` returns the policy's cell for a position, or None.
+        """
+        table = perfect().table.copy()
+        for r, (mine, theirs) in enumerate(_positions()):
+            cell = move(mine, theirs)
+            table[r] = (table[r] & 0xF0) | (NO_MOVE if cell is None else cell)
+        return cls(table)
+
+    def best_move(self, mine, theirs):
+        """Cell to play, -1 if the position is not covered or has no move."""
+        r = rank(mine, theirs)
+        if r < 0:
+            return -1
+        cell = self.packed[r] & 0xF
+        return -1 if cell == NO_MOVE else cell
+
+    def value(self, mine, theirs):
+        """-1, 0 or 1 for the side to move; 0 for positions that are not covered."""
+        r = rank(mine, theirs)
+        return 0 if r < 0 else (self.packed[r] >> 4) - 1
+
+    def _lookup(self, positions, player):
+        # Packed bytes of bitboard state ids with ``player`` to move; positions
+        # that are not covered read as a draw with no move
+        positions = np.asarray(positions, dtype=np.int64)
+        x, o = positions & FULL, positions >> 9
+        r = ranks(o, x) if player == 'O' else ranks(x, o)
+        return np.where(r >= 0, self.table[np.maximum(r, 0)], 0x10 | NO_MOVE)
+
+    def best_moves(self, positions, player='O'):
+        """
+        Cells to play for many positions at once.
+
+        Parameters
+        ----------
+        positions : array_like
+            Bitboard state ids (``bitboard.state_id``)
+        player : str
+            Side to move, 'X' or 'O' (default: 'O')
+
+        Returns
+        -------
+        numpy.ndarray
+            int8 cells, -1 where the position is not covered or has no move
+        """
+        cells = (self._lookup(positions, player) & 0xF).astype(np.int8)
+        cells[cells == NO_MOVE] = -1
+        return cells
+
+    def values(self, positions, player='O'):
+        """``value`` for many positions at once, as int8."""
+        return (self._lookup(positions, player) >> 4).astype(np.int8) - 1
+
+
+@functools.lru_cache(maxsize=None)
+def perfect():
+    """The perfect-play tablebase, solved once per process."""
+    return Tablebase.solve()
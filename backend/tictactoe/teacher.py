@@ -1,82 +1,189 @@
+import functools
 import random
 
+import numpy as np
+
+from .bitboard import CELLS, FULL, STANDARD, WIN_MASKS, action_of, cell_of
+
+# Lines in the order the teacher scans them: row i then column i, then diagonals
+_SCAN_ORDER = tuple(WIN_MASKS[k] for k in (0, 3, 1, 4, 2, 5, 6, 7))
+_CORNERS = tuple(CELLS[c] for c in (0, 2, 6, 8))
+_SIDES = tuple(CELLS[c] for c in (1, 3, 5, 7))
+_CENTER = CELLS[4]
+# Patterns of 'X' that make every free corner a fork point
+_FORK_PATTERNS = (CELLS[3] | CELLS[5], CELLS[1] | CELLS[7], CELLS[4])
+_ACTIONS = tuple(action_of(cell) for cell in range(9))
+# _FREE[x | o, cell] is True if the cell is empty
+_FREE = (np.arange(512)[:, None] >> np.arange(9) & 1) == 0
+
+
+@functools.lru_cache(maxsize=None)
+def rule_moves():
+    """
+    Cell chosen by ``Teacher.ruleMove`` for every board, indexed by bitboard
+    state id (``x | o << 9``); -1 where no rule applies or the masks overlap.
+    Built once per process.
+    """
+    table = np.full(1 << 18, -1, dtype=np.int8)
+    teacher = Teacher()
+    for x in range(512):
+        free = FULL & ~x
+        o = free
+        while True:
+            move = teacher.ruleMove(x, o)
+            if move is not None:
+                table[x | o << 9] = cell_of(move)
+            if not o:
+                break
+            o = (o - 1) & free
+    return table
+
+
 class Teacher:
+    """
+    Rule-based opponent playing 'X'. Board arguments are the bitboards x and o.
 
-    def __init__(self, level=0.9):
-        self.ability_level = level
+    On boards other than 3x3 (``shape``) the same rules are applied to every
+    line of k cells: a fork is a move that leaves two cells each completing a
+    line, the center is the middle cell or cells, and the remaining cells are
+    tried from the most lines to the fewest.
+    """
 
-    def win(self, board, key='X'):
-        for i in range(3):
-            row = [board[i][0], board[i][1], board[i][2]]
-            col = [board[0][i], board[1][i], board[2][i]]
-            if row.count(key) == 2 and row.count('-') == 1:
-                return i, row.index('-')
-            if col.count(key) == 2 and col.count('-') == 1:
-                return col.index('-'), i
-
-        diag1 = [board[0][0], board[1][1], board[2][2]]
-        diag2 = [board[0][2], board[1][1], board[2][0]]
-        if diag1.count(key) == 2 and diag1.count('-') == 1:
-            return diag1.index('-'), diag1.index('-')
-        if diag2.count(key) == 2 and diag2.count('-') == 1:
-            return diag2.index('-'), 2 - diag2.index('-')
+    def __init__(self, level=0.9, shape=STANDARD):
+        self.ability_level = level
+        self.shape = shape
+        if shape.standard:
+            self.lines, self.corners, self.sides = _SCAN_ORDER, _CORNERS, _SIDES
+            self.centers = (_CENTER,)
+        else:
+            last = shape.size - 1
+            corners = sorted({0, shape.cols - 1, last - shape.cols + 1, last})
+            distance = [(2*(c // shape.cols) - shape.rows + 1)**2 +
+                        (2*(c % shape.cols) - shape.cols + 1)**2 for c in range(shape.size)]
+            centers = [c for c in range(shape.size) if distance[c] == min(distance)]
+            self.lines = shape.win_masks
+            self.corners = tuple(shape.cells[c] for c in corners)
+            self.centers = tuple(shape.cells[c] for c in centers)
+            self.sides = tuple(shape.cells[c] for c in shape.move_order
+                               if c not in corners and c not in centers)
 
+    def win(self, mine, theirs):
+        for line in self.lines:
+            rest = line & ~mine
+            # Two of the line are ours and the remaining cell is free
+            if rest and not rest & (rest - 1) and not rest & theirs:
+                return self.shape.action_of(rest.bit_length() - 1)
         return None
 
-    def blockWin(self, board):
-        return self.win(board, key='O')
-
-    def fork(self, board):
-        for i, j in [(0, 0), (0, 2), (2, 0), (2, 2)]:
-            if board[i][j] == '-' and (
-                (board[1][0] == 'X' and board[1][2] == 'X') or 
-                (board[0][1] == 'X' and board[2][1] == 'X') or 
-                (board[1][1] == 'X')
-            ):
-                return i, j
+    def blockWin(self, x, o):
+        return self.win(o, x)
+
+    def fork(self, x, o):
+        if not self.shape.standard:
+            return self.forkMove(x, o)
+        if not any(x & p == p for p in _FORK_PATTERNS):
+            return None
+        for corner in _CORNERS:
+            if not (x | o) & corner:
+                return action_of(corner.bit_length() - 1)
         return None
 
-    def blockFork(self, board):
-        return self.fork(board)
+    def blockFork(self, x, o):
+        if not self.shape.standard:
+            return self.forkMove(o, x)
+        return self.fork(x, o)
+
+    def forkMove(self, mine, theirs):
+        # A free cell after which two different cells would each complete a line
+        shape = self.shape
+        for cell in shape.move_order:
+            if (mine | theirs) & shape.cells[cell]:
+                continue
+            after = mine | shape.cells[cell]
+            threats = set()
+            for line in shape.lines_through[cell]:
+                rest = line & ~after
+                if rest and not rest & (rest - 1) and not rest & theirs:
+                    threats.add(rest)
+            if len(threats) > 1:
+                return shape.action_of(cell)
+        return None
 
-    def center(self, board):
-        if board[1][1] == '-':
-            return 1, 1
+    def center(self, x, o):
+        for center in self.centers:
+            if not (x | o) & center:
+                return self.shape.action_of(center.bit_length() - 1)
         return None
 
-    def corner(self, board):
-        for i, j in [(0, 0), (0, 2), (2, 0), (2, 2)]:
-            if board[i][j] == '-':
-                return i, j
+    def corner(self, x, o):
+        for corner in self.corners:
+            if not (x | o) & corner:
+                return self.shape.action_of(corner.bit_length() - 1)
         return None
 
-    def sideEmpty(self, board):
-        for i, j in [(0, 1), (1, 0), (1, 2), (2, 1)]:
-            if board[i][j] == '-':
-                return i, j
+    def sideEmpty(self, x, o):
+        for side in self.sides:
+            if not (x | o) & side:
+                return self.shape.action_of(side.bit_length() - 1)
         return None
 
-    def randomMove(self, board):
-        possibles = [(i, j) for i in range(3) for j in range(3) if board[i][j] == '-']
+    def randomMove(self, x, o):
+        possibles = [self.shape.action_of(c) for c in self.shape.empty_cells(x | o)]
         return random.choice(possibles)
 
-    def makeMove(self, board):
+    def makeMove(self, x, o):
         if random.random() > self.ability_level:
-            return self.randomMove(board)
+            return self.randomMove(x, o)
+
+        if not self.shape.standard:
+            return self.ruleMove(x, o) or self.randomMove(x, o)
 
-        move = self.win(board)
+        # The rules below, looked up rather than evaluated
+        cell = rule_moves()[x | o << 9]
+        if cell < 0:
+            return self.randomMove(x, o)
+        return _ACTIONS[cell]
+
+    def ruleMove(self, x, o):
+        """ First move found by the rules, in order of priority, or None. """
+        move = self.win(x, o)
         if move: return move
-        move = self.blockWin(board)
+        move = self.blockWin(x, o)
         if move: return move
-        move = self.fork(board)
+        move = self.fork(x, o)
         if move: return move
-        move = self.blockFork(board)
+        move = self.blockFork(x, o)
         if move: return move
-        move = self.center(board)
+        move = self.center(x, o)
         if move: return move
-        move = self.corner(board)
+        move = self.corner(x, o)
         if move: return move
-        move = self.sideEmpty(board)
+        move = self.sideEmpty(x, o)
         if move: return move
+        return None
+
+    def make_moves(self, boards, rng):
+        """
+        ``makeMove`` for many boards at once.
+
+        Parameters
+        ----------
+        boards : array_like
+            Bitboard state ids (``x | o << 9``) with 'X' to move
+        rng : numpy.random.Generator
+            Source of the random moves
 
-        return self.randomMove(board)
+        Returns
+        -------
+        numpy.ndarray
+            Cells to play
+        """
+        if not self.shape.standard:
+            raise ValueError("Batched teacher moves only support the 3x3 board")
+        boards = np.asarray(boards, dtype=np.int64)
+        cells = rule_moves()[boards].astype(np.int64)
+        random_move = (rng.random(len(boards)) > self.ability_level) | (cells < 0)
+        if random_move.any():
+            free = _FREE[(boards[random_move] | boards[random_move] >> 9) & FULL]
+            cells[random_move] = np.where(free, rng.random(free.shape), -1.).argmax(axis=1)
+        return cells
@@ -0,0 +1,139 @@
+"""
+Headless batched training: many games advanced in lockstep as NumPy arrays.
+
+Each board plays the same episode as ``Game.playGame`` with the learner as 'O':
+a coin flip decides who opens, the learner picks its next action before the
+previous transition is applied, and every transition is handed to the learner
+as ``update_batch(s, s_, a, a_, r)`` over dense state ids.
+"""
+import numpy as np
+
+from .bitboard import FULL, WINNING
+from .qtable import ArrayQTable
+from .states import game_states
+from .teacher import Teacher
+
+_WINNING = np.array(WINNING, dtype=bool)
+
+
+def _id_table(space):
+    """Bitboard state id -> dense id of ``space``, -1 if absent."""
+    table = np.full(1 << 18, -1, dtype=np.int64)
+    table[space.codes] = np.arange(len(space))
+    return table
+
+
+class BatchedGames:
+    """
+    Plays episodes for a tabular learner on ``n_boards`` boards at once.
+
+    Parameters
+    ----------
+    agent : Learner
+        A learner with the 'array' Q store and an ``update_batch`` method
+    n_boards : int
+        Number of boards advanced together (default: 1024)
+    opponent : str
+        'teacher' to play a ``Teacher`` or 'self' to play the agent's own
+        epsilon-greedy policy, as in ``beginSelfPlay`` (default: 'teacher')
+    teacher : Teacher
+        Teacher to use for 'teacher' games (default: ``Teacher()``)
+    seed : int
+        Seed for the coin flips, the teacher's random moves and the learner's
+        move sampling
+    """
+
+    def __init__(self, agent, n_boards=1024, opponent='teacher', teacher=None, seed=None):
+        if not isinstance(agent.Q, ArrayQTable) or not hasattr(agent, 'update_batch'):
+            raise ValueError("Batched training needs a Q/SARSA agent with the 'array' Q store")
+        if agent.symmetry:
+            raise ValueError("Batched training does not support the symmetry layer")
+        if opponent not in ('teacher', 'self'):
+            raise ValueError("Unknown opponent")
+        space = game_states()
+        self.agent = agent
+        self.n_boards = n_boards
+        self.opponent = opponent
+        self.teacher = teacher or Teacher()
+        self.rng = np.random.default_rng(seed)
+        self.ids = _id_table(space)
+        self.legal = np.zeros((len(space), 9), dtype=bool)
+        for sid, cells in enumerate(space.actions):
+            self.legal[sid, list(cells)] = True
+
+    def _sids(self, x, o):
+        return self.ids[x | o << 9]
+
+    def _act(self, sids):
+        """Epsilon-greedy cells for many states, ties broken uniformly at random."""
+        agent = self.agent
+        q = agent.Q.table[sids]
+        explore = self.rng.random(len(sids)) < agent.eps
+        best = q == q.max(axis=1, keepdims=True)
+        candidates = np.where(explore[:, None], self.legal[sids], best)
+        cells = np.where(candidates, self.rng.random(q.shape), -1.).argmax(axis=1)
+        agent.eps *= (1.-agent.eps_decay)**len(sids)
+        return cells
+
+    def _opponent_move(self, boards, x, o):
+        if not len(boards):
+            return
+        if self.opponent == 'self':
+            x[boards] |= 1 << self._act(self._sids(x[boards], o[boards]))
+            return
+        x[boards] |= 1 << self.teacher.make_moves(x[boards] | o[boards] << 9, self.rng)
+
+    def play(self, episodes):
+        """Play ``episodes`` complete games, updating the agent as they go."""
+        n = min(self.n_boards, episodes)
+        x = np.zeros(n, dtype=np.int64)
+        o = np.zeros(n, dtype=np.int64)
+        s = np.zeros(n, dtype=np.int64)
+        a = np.zeros(n, dtype=np.int64)
+        active = np.zeros(n, dtype=bool)
+        started = 0
+
+        def start(boards):
+            x[boards] = 0
+            o[boards] = 0
+            player_first = self.rng.random(len(boards)) >= 0.5
+            self._opponent_move(boards[player_first], x, o)
+            s[boards] = self._sids(x[boards], o[boards])
+            a[boards] = self._act(s[boards])
+            active[boards] = True
+            return len(boards)
+
+        started += start(np.arange(n))
+        while active.any():
+            boards = np.flatnonzero(active)
+            o[boards] |= 1 << a[boards]
+
+            # Agent won or filled the board
+            agent_won = _WINNING[o[boards]]
+            agent_end = agent_won | ((x[boards] | o[boards]) == FULL)
+
+            playing = boards[~agent_end]
+            self._opponent_move(playing, x, o)
+            opponent_won = _WINNING[x[playing]]
+            opponent_end = opponent_won | ((x[playing] | o[playing]) == FULL)
+
+            ended = np.concatenate([boards[agent_end], playing[opponent_end]])
+            going = playing[~opponent_end]
+            s_next = self._sids(x[going], o[going])
+            a_next = self._act(s_next)
+
+            self.agent.update_batch(
+                np.concatenate([s[going], s[ended]]),
+                np.concatenate([s_next, np.full(len(ended), -1)]),
+                np.concatenate([a[going], a[ended]]),
+                np.concatenate([a_next, np.full(len(ended), -1)]),
+                np.concatenate([np.zeros(len(going)),
+                                agent_won[agent_end].astype(np.float64),
+                                -opponent_won[opponent_end].astype(np.float64)]))
+
+            s[going] = s_next
+            a[going] = a_next
+            active[ended] = False
+            if started < episodes and len(ended):
+                started += start(ended[:episodes - started])
+        return started
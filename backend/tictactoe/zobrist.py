@@ -0,0 +1,138 @@
+"""
+Zobrist hashing of positions, kept up to date move by move.
+
+Every (player, cell) pair gets a fixed random 64-bit code, and a position
+hashes to the XOR of the codes of its marks, so a move updates the hash with
+one XOR whatever the size of the board. The empty board hashes to 0. Codes
+come from a fixed seed, so a hash means the same position in every process.
+
+Agent tables stay keyed by the 'X'/'O'/'-' strings their files, symmetry and
+legal-move parsing rely on. ``KeyCache`` maps hashes to those strings: each
+position's key is built once and then handed out as the same string object,
+whose hash Python has already computed, so the table lookups that follow do
+not hash it again. The cache is small and evicts the least recently used
+position, so its memory stays bounded however large the board. Two
+positions with the same Zobrist hash are told apart by their masks; the
+cache counts such collisions and builds the key anew.
+"""
+import collections
+import functools
+import random
+
+from .bitboard import STANDARD
+
+SEED = 0x5EED
+
+
+class Zobrist:
+    """
+    Parameters
+    ----------
+    shape : bitboard.Shape
+        Board to hash positions of (default: the 3x3 board)
+    seed : int
+        Seed of the random codes (default: ``SEED``)
+    """
+
+    def __init__(self, shape=STANDARD, seed=SEED):
+        self.shape = shape
+        rng = random.Random(seed)
+        # Codes of 'X' and 'O' marks by cell
+        self.x_codes = tuple(rng.getrandbits(64) for _ in range(shape.size))
+        self.o_codes = tuple(rng.getrandbits(64) for _ in range(shape.size))
+
+    def hash(self, x, o):
+        """Hash of the position with masks (x, o), computed from scratch."""
+        h = 0
+        for cell in range(self.shape.size):
+            if x >> cell & 1:
+                h ^= self.x_codes[cell]
+            elif o >> cell & 1:
+                h ^= self.o_codes[cell]
+        return h
+
+    def collisions(self, positions):
+        """
+        Positions that share a hash with another one.
+
+        Parameters
+        ----------
+        positions : iterable
+            (x, o) mask pairs, e.g. every state of ``states.game_states``
+
+        Returns
+        -------
+        dict
+            Hash -> list of the (x, o) pairs with that hash, for every hash
+            shared by more than one position
+        """
+        seen = {}
+        for x, o in positions:
+            seen.setdefault(self.hash(x, o), set()).add((x, o))
+        return {h: sorted(p) for h, p in seen.items() if len(p) > 1}
+
+
+class KeyCache:
+    """
+    State keys by Zobrist hash, shared by all games on one board.
+
+    Parameters
+    ----------
+    zobrist : Zobrist
+        Hashing of the board
+    max_positions : int
+        Positions to remember; beyond that the least recently used one is
+        dropped (default: 4096)
+    """
+
+    def __init__(self, zobrist, max_positions=4096):
+        self.zobrist = zobrist
+        self.max_positions = max_positions
+        # Hash -> (x, o, key), least recently used first
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def key(self, h, x, o):
+        """The state key of the position (x, o), whose hash is h."""
+        entry = self.entries.get(h)
+        if entry is not None:
+            if entry[0] == x and entry[1] == o:
+                self.hits += 1
+                self.entries.move_to_end(h)
+                return entry[2]
+            self.collisions += 1
+            return self.zobrist.shape.to_key(x, o)
+        self.misses += 1
+        key = self.zobrist.shape.to_key(x, o)
+        self.entries[h] = (x, o, key)
+        if len(self.entries) > self.max_positions:
+            self.entries.popitem(last=False)
+        return key
+
+    def position(self, h):
+        """(x, o) masks of a cached hash, None if it is not cached; for debugging."""
+        entry = self.entries.get(h)
+        return None if entry is None else entry[:2]
+
+    def board(self, h):
+        """List-of-lists board of a cached hash, None if it is not cached."""
+        entry = self.entries.get(h)
+        return None if entry is None else self.zobrist.shape.to_board(entry[0], entry[1])
+
+    def stats(self):
+        return {'positions': len(self.entries), 'hits': self.hits,
+                'misses': self.misses, 'collisions': self.collisions}
+
+
+@functools.lru_cache(maxsize=None)
+def zobrist(shape=STANDARD):
+    """The ``Zobrist`` hashing of a board, one per process."""
+    return Zobrist(shape)
+
+
+@functools.lru_cache(maxsize=None)
+def key_cache(shape=STANDARD):
+    """The ``KeyCache`` of a board, one per process."""
+    return KeyCache(zobrist(shape))
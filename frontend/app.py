@@ -1,25 +1,30 @@
 # frontend/app.py
 from flask import Flask, Response, render_template, jsonify, request
 from flask_socketio import SocketIO, emit
+import atexit
 import json
 import sys
 import os
-import numpy as np
 import matplotlib.pyplot as plt
 import io
-import base64
 import logging
+import zlib
 
 # Add both project root and backend to Python path
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(PROJECT_ROOT)
 sys.path.append(os.path.join(PROJECT_ROOT, 'backend'))
 
-from tictactoe.game import Game, getStateKey
-from tictactoe.agent import Qlearner, SARSAlearner, ValueIterationAgent, PolicyIterationAgent
-from tictactoe.teacher import Teacher
-from play import GameLearning  # Import GameLearning class
-import pickle
+from tictactoe import metrics
+# Time the agents for /metrics; they must be imported after this. Spawned
+# training workers import this module as __mp_main__ and are left untimed.
+if __name__ != '__mp_main__':
+    metrics.enable()
+from tictactoe import bitboard
+from tictactoe.agent import ApproxQlearner, Learner, NegamaxAgent, Qlearner, SARSAlearner, ValueIterationAgent, PolicyIterationAgent
+from tictactoe.registry import AgentRegistry
+from tictactoe.sessions import GameSessions
+from tictactoe.jobs import TrainingJobs
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -29,16 +34,21 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'  # Add secret key for SocketIO
 socketio = SocketIO(app, cors_allowed_origins="*")  # Allow CORS for WebSocket
 
-# Load agents
-def load_agent(agent_type):
+# Agent files, one per agent type
+AGENT_FILES = {'q': 'q_agent.pkl', 's': 'sarsa_agent.pkl', 'v': 'v_agent.pkl', 'p': 'p_agent.pkl',
+               'n': 'negamax_agent.pkl', 'f': 'fa_agent.pkl'}
+
+def agent_path(agent_type):
+    if agent_type not in AGENT_FILES:
+        raise ValueError("Unknown agent type")
+    return os.path.join(PROJECT_ROOT, 'backend', AGENT_FILES[agent_type])
+
+def read_agent(agent_type, path):
     """Load or create a new agent"""
-    path = os.path.join(PROJECT_ROOT, 'backend', 
-                       'q_agent.pkl' if agent_type == 'q' else 'sarsa_agent.pkl' if agent_type == 's' else 'v_agent.pkl' if agent_type == 'v' else 'p_agent.pkl')
     try:
         if os.path.isfile(path):
             logger.debug(f"Loading agent from {path}")
-            with open(path, 'rb') as f:
-                return pickle.load(f)
+            return Learner.load(path)
     except Exception as e:
         logger.warning(f"Could not load agent: {e}")
     
@@ -53,18 +63,37 @@ def load_agent(agent_type):
         return agent
     elif agent_type == 'p':
         agent = PolicyIterationAgent(gamma=0.9)
-        agent.compute_policy_iteration()
+        agent.compute_policy_iteration(method='exact')
         return agent
+    elif agent_type == 'n':
+        return NegamaxAgent()
+    elif agent_type == 'f':
+        return ApproxQlearner()
     else:
         raise ValueError("Unknown agent type")
 
-current_game = None
+# One shared, read-only instance per agent type, reloaded when its file changes
+agents = AgentRegistry({agent_type: agent_path(agent_type) for agent_type in AGENT_FILES}, read_agent)
+
+@metrics.timed('tictactoe_load_agent_seconds', 'Latency of load_agent, cache hits included')
+def load_agent(agent_type):
+    return agents.get(agent_type)
+
+# Live games, one per Socket.IO session
+app.config['MAX_GAMES'] = int(os.environ.get('MAX_GAMES', 10000))
+app.config['GAME_IDLE_SECONDS'] = float(os.environ.get('GAME_IDLE_SECONDS', 1800))
+games = GameSessions(app.config['MAX_GAMES'], app.config['GAME_IDLE_SECONDS'])
+
+def evict_idle_games():
+    while True:
+        socketio.sleep(60)
+        evicted = games.evict_idle()
+        if evicted:
+            logger.debug(f"Evicted {evicted} idle games, {len(games)} left")
 
 @app.route('/')
 def index():
     try:
-        global current_game
-        current_game = Game(load_agent("q"))
         return render_template('game.html')
     except Exception as e:
         logger.error(f"Error rendering game page: {str(e)}")
@@ -82,29 +111,45 @@ def train():
 def rewards():
     return render_template('rewards.html')
 
+def start_game(agent_type):
+    """Start a game for the current session; False if the server is full"""
+    load_agent(agent_type)  # Rejects unknown agent types
+    if not games.start(request.sid, agent_type):
+        emit('error', {'message': 'Too many games in progress, please try again later.'})
+        return False
+    return True
+
 @socketio.on('player_move')
+@metrics.timed('tictactoe_socketio_seconds', 'Time spent in Socket.IO handlers', event='player_move')
 def handle_move(data):
     try:
         logger.debug(f"Received player move: {data}")
-        global current_game
-        if current_game is None:
+        game = games.get(request.sid)
+        if game is None:
             logger.debug("Creating new game")
-            current_game = Game(load_agent(data['agent']))
+            if not start_game(data['agent']):
+                return
+            game = games.get(request.sid)
+        x, o, agent_type = game
         
         # Process player move
         row, col = data['row'], data['col']
         logger.debug(f"Player move at position ({row}, {col})")
-        current_game.board[row][col] = 'X'
+        if row not in range(3) or col not in range(3) or \
+                (x | o) & bitboard.CELLS[row*3 + col] or bitboard.is_terminal(x, o):
+            emit('error', {'message': 'Invalid move'})
+            return
+        x |= bitboard.CELLS[row*3 + col]
+        games.update(request.sid, x, o)
         
-        # print(current_game.checkForEnd('X'))
-        if current_game.checkForEnd('X') == 1:
+        if bitboard.is_win(x):
             emit('agent_move', {
                 'game_over': True,
                 'winner': 'X',
                 'message': 'You win!'
             })
             return
-        elif current_game.checkForDraw():
+        elif bitboard.is_full(x, o):
             emit('agent_move', {
                 'game_over': True,
                 'winner': None,
@@ -113,9 +158,9 @@ def handle_move(data):
             return
         
         # Get agent move
-        state = getStateKey(current_game.board)  # Use the imported function
-        action = current_game.agent.get_action(state)
-        current_game.agentMove(action)
+        action = load_agent(agent_type).get_action(bitboard.to_key(x, o))
+        o |= bitboard.CELLS[bitboard.cell_of(action)]
+        games.update(request.sid, x, o)
         
         response = {
             'row': action[0],
@@ -123,13 +168,13 @@ def handle_move(data):
             'game_over': False
         }
         
-        if current_game.checkForEnd('O') == 1:
+        if bitboard.is_win(o):
             response.update({
                 'game_over': True,
                 'winner': 'O',
                 'message': 'Agent wins!'
             })
-        elif current_game.checkForDraw():
+        elif bitboard.is_full(x, o):
             response.update({
                 'game_over': True,
                 'winner': None,
@@ -143,76 +188,159 @@ def handle_move(data):
         emit('error', {'message': str(e)})
 
 @socketio.on('new_game')
+@metrics.timed('tictactoe_socketio_seconds', 'Time spent in Socket.IO handlers', event='new_game')
 def new_game(data):
-    global current_game
-    current_game = Game(load_agent(data['agent']))
-    emit('game_reset')
+    try:
+        if start_game(data['agent']):
+            emit('game_reset')
+    except Exception as e:
+        logger.error(f"Error in new_game: {str(e)}")
+        emit('error', {'message': str(e)})
+
+@socketio.on('disconnect')
+@metrics.timed('tictactoe_socketio_seconds', 'Time spent in Socket.IO handlers', event='disconnect')
+def handle_disconnect(*args):
+    games.end(request.sid)
+
+# Training runs in worker processes, see tictactoe/jobs.py
+app.config['TRAINING_WORKERS'] = int(os.environ.get('TRAINING_WORKERS', 2))
+training_jobs = TrainingJobs(app.config['TRAINING_WORKERS'])
+
+# Episodes reported so far by each running job
+trained_episodes = {}
+
+def stream_training_events():
+    """Forward job progress and results to the session that started each job"""
+    episodes_total = metrics.counter('tictactoe_training_episodes_total',
+                                     'Episodes played by training jobs')
+    while True:
+        for job_id, sid, event, data in training_jobs.poll():
+            if event == 'progress':
+                episodes_total.inc(data['episodes'] - trained_episodes.get(job_id, 0))
+                trained_episodes[job_id] = data['episodes']
+                data = dict(data,
+                            progress=100 * data['episodes'] / data['total'],
+                            message=f"{data['episodes']}/{data['total']} episodes, "
+                                    f"{data['episodes_per_sec']:.0f} episodes/s, "
+                                    f"ETA {data['eta']:.0f}s, "
+                                    f"win rate {data['win_rate']:.0%}")
+            else:
+                trained_episodes.pop(job_id, None)
+                metrics.counter('tictactoe_training_jobs_total', 'Training jobs that ended',
+                                result=event).inc()
+            socketio.emit(f'training_{event}', dict(data, job_id=job_id), to=sid)
+        socketio.sleep(0.25)
 
 @socketio.on('start_training')
+@metrics.timed('tictactoe_socketio_seconds', 'Time spent in Socket.IO handlers', event='start_training')
 def handle_training(data):
     try:
         logger.debug(f"Starting training with parameters: {data}")
         agent_type = data['agent_type']
-        method = data.get('method', None)
-        episodes = data.get('episodes', None)
-        load_existing = data.get('load_existing', False)
-        
-        # Prepare arguments for GameLearning
-        class Args:
-            def __init__(self, agent_type, path, load, teacher_episodes):
-                self.agent_type = agent_type
-                self.path = path
-                self.load = load
-                self.teacher_episodes = teacher_episodes
-        
-        args = Args(
-            agent_type=agent_type,
-            path=os.path.join(PROJECT_ROOT, 'backend', f'{"sarsa" if agent_type=="s" else agent_type }_agent.pkl'),
-            load=load_existing,
-            teacher_episodes=episodes if method == 'teacher' else None
-        )
-        
-        # Initialize GameLearning
-        game_learning = GameLearning(args)
-        
-        if method == 'teacher' and (agent_type == 'q' or agent_type == 's'):
-            game_learning.beginTeaching(episodes)
-        else:
-            game_learning.beginSelfPlay(episodes)
-        
-        emit('training_complete')
+        job_id = training_jobs.submit({
+            'agent_type': agent_type,
+            'path': agent_path(agent_type),
+            'method': data.get('method', None),
+            'episodes': data.get('episodes', None),
+            'load_existing': data.get('load_existing', False),
+        }, owner=request.sid)
+        emit('training_started', {'job_id': job_id})
         
     except Exception as e:
         logger.error(f"Error in training: {str(e)}")
         emit('training_error', {'message': str(e)})
 
+@socketio.on('cancel_training')
+@metrics.timed('tictactoe_socketio_seconds', 'Time spent in Socket.IO handlers', event='cancel_training')
+def handle_cancel_training(data):
+    if not training_jobs.cancel(data.get('job_id'), owner=request.sid):
+        emit('training_error', {'message': 'No such training job'})
+
+@app.route('/agent_stats')
+def agent_stats():
+    return jsonify(agents.stats())
+
+metrics.collect('tictactoe_games', 'Games in progress', 'gauge', lambda: [({}, len(games))])
+metrics.collect('tictactoe_training_jobs', 'Training jobs queued or running', 'gauge',
+                lambda: [({}, len(training_jobs))])
+metrics.collect('tictactoe_agent_loads_total', 'Agent cache lookups', 'counter',
+                lambda: [({'agent_type': agent_type, 'result': result}, counts[key])
+                         for agent_type, counts in agents.stats().items()
+                         for result, key in (('hit', 'hits'), ('miss', 'misses'))])
+
+@app.route('/metrics')
+def metrics_route():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Reward data rendered once per agent version: (agent type, kind) -> (version, ETag, body)
+reward_cache = {}
+
+def cached_rewards(agent_type, kind, render):
+    """ETag and body of the rewards data of kind for the current agent version"""
+    version, agent = agents.entry(agent_type)
+    cached = reward_cache.get((agent_type, kind))
+    if cached is None or cached[0] != version:
+        etag = f"{agent_type}-{kind}-{zlib.crc32(repr(version).encode()):08x}"
+        cached = (version, etag, render(agent.history))
+        reward_cache[(agent_type, kind)] = cached
+    return cached[1], cached[2]
+
+def conditional_response(etag, body, mimetype):
+    """Response that answers 304 when the client already has this version"""
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def render_series(history):
+    episodes, rewards = history.series()
+    return json.dumps({
+        'episodes': episodes.tolist(),
+        'rewards': rewards.tolist(),
+        'summary': history.summary(),
+    })
+
+def render_plot(history):
+    episodes, rewards = history.series()
+    plt.figure(figsize=(10, 6))
+    plt.plot(episodes, rewards)
+    plt.title('Agent Cumulative Reward vs. Episode')
+    plt.xlabel('Episode')
+    plt.ylabel('Cumulative Reward')
+    
+    # Save plot to memory buffer
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png')
+    plt.close()
+    return buf.getvalue()
+
+@app.route('/get_rewards/<agent_type>/series')
+def get_reward_series(agent_type):
+    try:
+        etag, body = cached_rewards(agent_type, 'series', render_series)
+        return conditional_response(etag, body, 'application/json')
+    except Exception as e:
+        logger.error(f"Error getting reward series: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/get_rewards/<agent_type>')
 def get_rewards(agent_type):
     try:
         logger.debug(f"Fetching rewards for agent type: {agent_type}")
-        agent = load_agent(agent_type)
-        if not agent.rewards:
+        if not load_agent(agent_type).history.episodes:
             return jsonify({'error': 'No rewards data available'})
-        
-        # Plot in memory
-        plt.figure(figsize=(10, 6))
-        plt.plot(np.cumsum(agent.rewards))
-        plt.title('Agent Cumulative Reward vs. Episode')
-        plt.xlabel('Episode')
-        plt.ylabel('Cumulative Reward')
-        
-        # Save plot to memory buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        
-        # Return image directly as response
-        return Response(buf.getvalue(), mimetype='image/png')
+        etag, body = cached_rewards(agent_type, 'png', render_plot)
+        return conditional_response(etag, body, 'image/png')
     
     except Exception as e:
         logger.error(f"Error getting rewards: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # Not done at import: spawned training workers import this module too
+    agents.warm()  # Load every agent before the first request needs it
+    logger.debug(f"Agents loaded: {agents.stats()}")
+    socketio.start_background_task(evict_idle_games)
+    socketio.start_background_task(stream_training_events)
+    atexit.register(training_jobs.shutdown)
     socketio.run(app, debug=True)
\ No newline at end of file
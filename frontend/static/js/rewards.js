@@ -3,6 +3,43 @@ document.addEventListener('DOMContentLoaded', () => {
     console.log('Rewards interface initialized');
     const agentSelect = document.getElementById('agent-select');
     const rewardsPlot = document.getElementById('rewards-plot');
+    const width = 800, height = 450;
+    const margin = { top: 30, right: 20, bottom: 45, left: 70 };
+
+    // Draw the downsampled cumulative reward series as an SVG line chart
+    function drawSeries(data) {
+        const xs = data.episodes, ys = data.rewards;
+        if (!data.summary.episodes) {
+            rewardsPlot.innerHTML = '<div class="text-center">No rewards data available</div>';
+            return;
+        }
+        const xMin = xs[0], xMax = Math.max(xs[xs.length - 1], xMin + 1);
+        const yMin = Math.min(...ys), yMax = Math.max(Math.max(...ys), yMin + 1);
+        const plotW = width - margin.left - margin.right;
+        const plotH = height - margin.top - margin.bottom;
+        const px = x => margin.left + (x - xMin) / (xMax - xMin) * plotW;
+        const py = y => margin.top + (yMax - y) / (yMax - yMin) * plotH;
+        const points = xs.map((x, i) => `${px(x).toFixed(1)},${py(ys[i]).toFixed(1)}`).join(' ');
+        const s = data.summary;
+
+        rewardsPlot.innerHTML = `
+            <svg viewBox="0 0 ${width} ${height}" class="w-100" role="img" aria-label="Rewards Plot">
+                <text x="${width / 2}" y="18" text-anchor="middle">Agent Cumulative Reward vs. Episode</text>
+                <line x1="${margin.left}" y1="${margin.top + plotH}" x2="${margin.left + plotW}" y2="${margin.top + plotH}" stroke="#666"/>
+                <line x1="${margin.left}" y1="${margin.top}" x2="${margin.left}" y2="${margin.top + plotH}" stroke="#666"/>
+                <text x="${margin.left}" y="${height - 25}" text-anchor="start">${Math.round(xMin)}</text>
+                <text x="${margin.left + plotW}" y="${height - 25}" text-anchor="end">${Math.round(xMax)}</text>
+                <text x="${margin.left + plotW / 2}" y="${height - 8}" text-anchor="middle">Episode</text>
+                <text x="${margin.left - 8}" y="${margin.top + 5}" text-anchor="end">${Math.round(yMax)}</text>
+                <text x="${margin.left - 8}" y="${margin.top + plotH}" text-anchor="end">${Math.round(yMin)}</text>
+                <text transform="translate(18, ${margin.top + plotH / 2}) rotate(-90)" text-anchor="middle">Cumulative Reward</text>
+                <polyline points="${points}" fill="none" stroke="#1f77b4" stroke-width="1.5"/>
+            </svg>
+            <div class="text-center mt-2">
+                ${s.episodes} episodes: ${s.wins} wins, ${s.draws} draws, ${s.losses} losses
+            </div>
+        `;
+    }
 
     function updateRewardsPlot() {
         console.log('Updating rewards plot for agent:', agentSelect.value);
@@ -11,12 +48,19 @@ document.addEventListener('DOMContentLoaded', () => {
                 <span>Loading rewards plot...</span>
             </div>
         `;
-        
-        // Set image source directly to the backend endpoint
-        const imgUrl = `/get_rewards/${agentSelect.value}`;
-        rewardsPlot.innerHTML = `
-            <img src="${imgUrl}" class="img-fluid" alt="Rewards Plot">
-        `;
+
+        fetch(`/get_rewards/${agentSelect.value}/series`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                drawSeries(data);
+            })
+            .catch(error => {
+                console.error('Error loading rewards:', error);
+                rewardsPlot.innerHTML = `<div class="text-center text-danger">Error: ${error.message}</div>`;
+            });
     }
 
     agentSelect.addEventListener('change', updateRewardsPlot);
@@ -8,6 +8,10 @@ document.addEventListener('DOMContentLoaded', () => {
     const agentTypeSelect = document.getElementById('agent-type');
     const trainMethodGroup = document.getElementById('train-method-group');
     const episodesGroup = document.getElementById('episodes-group');
+    const cancelBtn = document.getElementById('cancel-training');
+    let currentJob = null;
+    // Agent types that learn from episodes; the others are solved or search on creation
+    const learns = (agentType) => ['q', 's', 'f'].includes(agentType);
 
     socket.on('connect', () => {
         console.log('Socket connected');
@@ -15,7 +19,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     agentTypeSelect.addEventListener('change', () => {
         const agentType = agentTypeSelect.value;
-        if (agentType === 'q' || agentType === 's') {
+        if (learns(agentType)) {
             trainMethodGroup.style.display = 'block';
             episodesGroup.style.display = 'block';
         } else {
@@ -29,8 +33,8 @@ document.addEventListener('DOMContentLoaded', () => {
             e.preventDefault();
             const data = {
                 agent_type: agentTypeSelect.value,
-                method: agentTypeSelect.value === 'q' || agentTypeSelect.value === 's' ? document.getElementById('train-method').value : null,
-                episodes: agentTypeSelect.value === 'q' || agentTypeSelect.value === 's' ? parseInt(document.getElementById('episodes').value) : null,
+                method: learns(agentTypeSelect.value) ? document.getElementById('train-method').value : null,
+                episodes: learns(agentTypeSelect.value) ? parseInt(document.getElementById('episodes').value) : null,
                 load_existing: document.getElementById('load-existing').checked
             };
             console.log('Starting training with params:', data);
@@ -43,18 +47,42 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    cancelBtn.addEventListener('click', () => {
+        if (currentJob) {
+            socket.emit('cancel_training', { job_id: currentJob });
+        }
+    });
+
+    socket.on('training_started', (data) => {
+        currentJob = data.job_id;
+        cancelBtn.disabled = false;
+        trainStatus.textContent = 'Training queued...';
+    });
+
     socket.on('training_progress', (data) => {
         progressBar.style.width = `${data.progress}%`;
         trainStatus.textContent = data.message;
     });
 
     socket.on('training_complete', () => {
+        currentJob = null;
+        cancelBtn.disabled = true;
         trainStatus.textContent = 'Training complete!';
         progressBar.style.width = '100%';
     });
 
+    socket.on('training_cancelled', () => {
+        currentJob = null;
+        cancelBtn.disabled = true;
+        trainStatus.textContent = 'Training cancelled.';
+    });
+
     socket.on('training_error', (data) => {
         console.error('Training error:', data.message);
+        if (data.job_id === currentJob) {
+            currentJob = null;
+            cancelBtn.disabled = true;
+        }
         trainStatus.textContent = 'Error: ' + data.message;
         trainStatus.classList.add('text-danger');
     });